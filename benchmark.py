@@ -0,0 +1,286 @@
+###########################################
+# Benchmarks for training and scoring
+###########################################
+
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+import sklearn
+from scipy import sparse
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split
+
+import census
+import metrics
+from pipeline import FeatureSelector
+
+
+def _median_seconds(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        fn()
+        times.append(perf_counter() - start)
+    return float(np.median(times))
+
+
+def feature_count_benchmark(estimator, importances, X_train, y_train, X_test, y_test,
+                            counts=(5, 10, 20, None), repeats=5):
+    '''
+    Train and predict latency of 'estimator' against the number of features it keeps, next to
+    its F-0.5 on the test set, so the smallest feature set within a latency budget can be picked.
+
+    inputs:
+       - importances: the feature importances the columns are ranked by
+       - counts: numbers of top features to keep, None for all of them
+       - repeats: timings are the median over this many runs
+    '''
+
+    def contiguous(X):
+        # CSR input (the notebook's dataset) stays sparse
+        return X.tocsr() if sparse.issparse(X) else np.ascontiguousarray(X, dtype=np.float32)
+
+    rows = []
+    for k in counts:
+        selector = FeatureSelector(k).fit(importances)
+        X_tr = contiguous(selector.transform(X_train))
+        X_te = contiguous(selector.transform(X_test))
+
+        model = clone(estimator).fit(X_tr, y_train)
+        rows.append({
+            'n_features': X_tr.shape[1],
+            'fit_seconds': _median_seconds(lambda: clone(estimator).fit(X_tr, y_train), repeats),
+            'predict_seconds': _median_seconds(lambda: model.predict(X_te), repeats),
+            'f_test': float(metrics.binary_scores(y_test, model.predict(X_te))['f0.5']),
+        })
+
+    print("{:>10} {:>12} {:>14} {:>8}".format('features', 'fit (s)', 'predict (s)', 'F-0.5'))
+    for row in rows:
+        print("{n_features:>10} {fit_seconds:>12.4f} {predict_seconds:>14.5f} {f_test:>8.4f}".format(**row))
+    return rows
+
+
+def compare_fbeta(estimator, X_before, X_after, y, test_size=0.2, random_state=0):
+    '''
+    F-0.5 of 'estimator' trained and tested on the same split of two versions of the feature
+    matrix, e.g. dense and CSR, to check a change of storage doesn't change the model.
+    '''
+
+    train, test = train_test_split(np.arange(len(y)), test_size=test_size, random_state=random_state)
+    y = np.asarray(y)
+    scores = []
+    for X in (X_before, X_after):
+        X = X.tocsr() if sparse.issparse(X) else np.asarray(X)
+        model = clone(estimator).fit(X[train], y[train])
+        scores.append(float(metrics.binary_scores(y[test], model.predict(X[test]))['f0.5']))
+    print("F-0.5 before: {:.4f}, after: {:.4f}".format(*scores))
+    return tuple(scores)
+
+
+def _apply_log_minmax(features_raw):
+    # The notebook's path: DataFrame.apply with a lambda, then MinMaxScaler on a DataFrame
+    from sklearn.preprocessing import MinMaxScaler
+
+    features_log_transformed = pd.DataFrame(data=features_raw)
+    features_log_transformed[census.SKEWED] = features_raw[census.SKEWED].apply(lambda x: np.log(x + 1))
+    features_log_minmax_transform = pd.DataFrame(data=features_log_transformed)
+    features_log_minmax_transform[census.NUMERICAL] = MinMaxScaler().fit_transform(
+        features_log_transformed[census.NUMERICAL])
+    return features_log_minmax_transform[census.NUMERICAL].to_numpy()
+
+
+def numeric_transform_benchmark(features_raw, repeats=5):
+    '''
+    Throughput and peak memory of the log transform + min-max scaling of the numerical columns:
+    the notebook's DataFrame.apply/MinMaxScaler path against census.log_minmax, fitting the
+    min/max, and the fused single pass with the min/max already known (the nightly-batch case).
+
+    Peak memory is what tracemalloc sees allocated during one run, so it counts the temporaries
+    of each path and not the input frame. Every run of the apply path gets a fresh copy of the
+    input, made outside the timings, since it may write to the frame it is given.
+    '''
+
+    expected = _apply_log_minmax(features_raw.copy())
+    _, data_min, data_max = census.log_minmax(features_raw)
+    paths = [('apply + MinMaxScaler', lambda frame: _apply_log_minmax(frame)),
+             ('log_minmax (fit)', lambda frame: census.log_minmax(frame)[0]),
+             ('log_minmax (fused)', lambda frame: census.log_minmax(frame, data_min, data_max)[0])]
+
+    rows = []
+    for name, fn in paths:
+        times = []
+        for _ in range(repeats):
+            frame = features_raw.copy()
+            start = perf_counter()
+            fn(frame)
+            times.append(perf_counter() - start)
+
+        frame = features_raw.copy()
+        tracemalloc.start()
+        result = fn(frame)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        seconds = float(np.median(times))
+        rows.append({'path': name, 'seconds': seconds,
+                     'rows_per_second': len(features_raw) / seconds if seconds > 0 else float('inf'),
+                     'peak_bytes': peak,
+                     'max_abs_diff': float(np.abs(np.asarray(result, dtype=np.float64) - expected).max())})
+
+    print("{:>22} {:>10} {:>14} {:>12} {:>10}".format('path', 'time (s)', 'rows/sec', 'peak (MB)', 'max diff'))
+    for row in rows:
+        print("{path:>22} {seconds:>10.4f} {rows_per_second:>14,.0f} {peak_mb:>12.1f} {max_abs_diff:>10.2g}".format(
+            peak_mb=row['peak_bytes'] / 1024.0 ** 2, **row))
+    return rows
+
+
+###########################################
+# Benchmark harness across dataset scales
+###########################################
+
+def _write_resampled(path, features_raw, stats, rows, block_rows=100000):
+    # Encodes features_raw.iloc[rows] 'block_rows' rows at a time into a float32 .npy file and
+    # reopens it memory-mapped, so building a large scale never holds the matrix in memory
+    n_columns = len(census.encoded_columns(stats))
+    out = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(len(rows), n_columns))
+    for start in range(0, len(rows), block_rows):
+        block = features_raw.iloc[rows[start:start + block_rows]]
+        out[start:start + len(block)] = census.transform_chunk(block, stats).to_numpy(dtype=np.float32)
+    out.flush()
+    del out
+    return np.load(path, mmap_mode='r')
+
+
+def peak_rss_bytes():
+    '''
+    Peak resident set size of this process so far (None where the resource module is missing).
+    '''
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _timings(fn, repeats, warmup, tails=False):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        fn()
+        times.append(perf_counter() - start)
+    times = np.asarray(times)
+    timings = {'median': float(np.median(times)),
+               'min': float(times.min()),
+               'max': float(times.max()),
+               'repeats': repeats}
+    if tails:
+        # Only meaningful with enough repeats; with a handful, p95/p99 are just the max
+        timings['p95'] = float(np.percentile(times, 95))
+        timings['p99'] = float(np.percentile(times, 99))
+    return timings
+
+
+def run_benchmarks(learners, data, scales=(1, 10), repeats=7, warmup=1,
+                   single_row_repeats=200, test_size=0.2, output=None, random_state=0):
+    '''
+    Times every learner's fit, batch predict and single-row predict on census data resampled to
+    each of 'scales', and returns (and optionally writes as JSON) machine-readable results.
+
+    Fit and batch predict are summarised as median/min/max over 'repeats' runs after 'warmup'
+    untimed runs; single-row predict, with 'single_row_repeats' runs, also gets p95/p99. Each
+    scale also records the number of rows and the peak RSS so far.
+
+    The rows of 'data' are split into train and test first and each side is resampled with
+    replacement on its own, so no test row duplicates a training row. The encoded matrices of a
+    scale are written block by block to memory-mapped files in a temp folder rather than built in
+    memory; the learners still load what they fit on, so budget about 0.4 GB of float32 per
+    million training rows (10x the census is ~360k rows, 100x ~3.6M).
+
+    inputs:
+       - learners: unfitted estimators, each run fits its own clone
+       - data: the census frame, e.g. census.load_census()
+       - output: path of the JSON file to write, None to only return the results
+    '''
+
+    results = {'python': platform.python_version(), 'sklearn': sklearn.__version__,
+               'machine': platform.machine(), 'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'runs': []}
+
+    features_raw, income = census.split_target(data)
+    stats = census.fit_frame(features_raw)
+    y = income.to_numpy()
+    base_train, base_test = train_test_split(np.arange(len(y)), test_size=test_size,
+                                             random_state=random_state, stratify=y)
+    rng = np.random.RandomState(random_state)
+
+    work_dir = tempfile.mkdtemp(prefix='donor_benchmark_')
+    try:
+        for scale in scales:
+            train_rows = rng.choice(base_train, int(len(base_train) * scale))
+            test_rows = rng.choice(base_test, int(len(base_test) * scale))
+            X_train = _write_resampled(os.path.join(work_dir, 'train-{}.npy'.format(scale)),
+                                       features_raw, stats, train_rows)
+            X_test = _write_resampled(os.path.join(work_dir, 'test-{}.npy'.format(scale)),
+                                      features_raw, stats, test_rows)
+            y_train, y_test = y[train_rows], y[test_rows]
+            single_row = np.asarray(X_test[:1])
+
+            for learner in learners:
+                model = clone(learner).fit(X_train, y_train)
+                run = {
+                    'learner': learner.__class__.__name__,
+                    'scale': scale,
+                    'n_train': len(X_train),
+                    'n_test': len(X_test),
+                    'fit': _timings(lambda: clone(learner).fit(X_train, y_train), repeats, warmup),
+                    'predict_batch': _timings(lambda: model.predict(X_test), repeats, warmup),
+                    'predict_single': _timings(lambda: model.predict(single_row), single_row_repeats, warmup,
+                                               tails=True),
+                    'f_test': float(metrics.binary_scores(y_test, model.predict(X_test))['f0.5']),
+                    'peak_rss_bytes': peak_rss_bytes(),
+                }
+                results['runs'].append(run)
+                print("{learner:>24} x{scale:<5} fit {fit[median]:.4f}s  batch {predict_batch[median]:.4f}s  "
+                      "single {predict_single[median]:.6f}s".format(**run))
+            del X_train, X_test, model
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.naive_bayes import GaussianNB
+
+    parser = argparse.ArgumentParser(description="Benchmark the donor learners across dataset scales.")
+    parser.add_argument('--csv', default="census.csv")
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10])
+    parser.add_argument('--repeats', type=int, default=7)
+    parser.add_argument('--output', default="benchmark.json")
+    args = parser.parse_args()
+
+    run_benchmarks([GaussianNB(), LogisticRegression(random_state=0),
+                    RandomForestClassifier(random_state=0)],
+                   census.load_census(args.csv), scales=args.scales, repeats=args.repeats,
+                   output=args.output)
@@ -0,0 +1,496 @@
+###########################################
+# Loading and preprocessing of the census data
+###########################################
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import profiling
+
+# Columns of census.csv, split by how the notebook treats them
+NUMERICAL = ['age', 'education-num', 'capital-gain', 'capital-loss', 'hours-per-week']
+SKEWED = ['capital-gain', 'capital-loss']
+CATEGORICAL = ['workclass', 'education_level', 'marital-status', 'occupation',
+               'relationship', 'race', 'sex', 'native-country']
+TARGET = 'income'
+
+# Explicit dtypes so pandas doesn't have to infer them (and doesn't fall back to object/float64)
+SCHEMA = {
+    'age': 'uint8',
+    'education-num': 'float32',
+    'capital-gain': 'float32',
+    'capital-loss': 'float32',
+    'hours-per-week': 'float32',
+}
+SCHEMA.update({col: 'category' for col in CATEGORICAL + [TARGET]})
+
+CACHE_DIR = '.census_cache'
+
+# Frames already loaded in this process, keyed by (absolute path, size, mtime) of their csv
+_frames = {}
+
+
+def file_key(path, block_size=1 << 20):
+    '''
+    Returns a key identifying the current contents of 'path': a hash of its bytes plus its mtime.
+    '''
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return "{}-{}".format(digest.hexdigest(), os.stat(path).st_mtime_ns)
+
+
+def load_census(path="census.csv", cache_dir=CACHE_DIR):
+    '''
+    Loads the census data once with the explicit dtype SCHEMA.
+
+    The parsed frame is written to a Feather file in 'cache_dir' named after the csv's hash and
+    mtime, so later runs skip the csv parse entirely. Within a process the same frame object is
+    returned on every call for an unchanged file (same path, size and mtime), without reading
+    the csv again; treat it as read-only.
+
+    inputs:
+       - path: the census csv
+       - cache_dir: where to keep the binary copy, None to disable the on-disk cache
+    '''
+
+    # Cheap stat-based key first; the content hash is only needed to find the on-disk copy
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key in _frames:
+        return _frames[memo_key]
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, "{}.feather".format(file_key(path)))
+
+    if cache_path is not None and os.path.exists(cache_path):
+        with profiling.stage('read_cache'):
+            data = pd.read_feather(cache_path)
+    else:
+        with profiling.stage('read_csv'):
+            data = pd.read_csv(path, dtype=SCHEMA)
+        if cache_path is not None:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                data.to_feather(cache_path)
+            except ImportError:
+                # pyarrow is not installed, keep going with the parsed frame only
+                pass
+
+    _frames[memo_key] = data
+    return data
+
+
+def split_target(data):
+    '''
+    Splits the census frame into the features and the 0/1 income label.
+    '''
+
+    income = (data[TARGET] == '>50K').astype(np.int8)
+    features_raw = data.drop(TARGET, axis=1)
+    return features_raw, income
+
+
+def downcast(frame):
+    '''
+    Stores every column of 'frame' in the most compact dtype that keeps its values: uint8 for
+    0/1 dummies, float32 for floats, the smallest integer type for integers and categorical for
+    strings.
+
+    Returns the downcast frame (the input is left alone) and a per-column report of the dtypes
+    and bytes before and after.
+    '''
+
+    columns = {}
+    for col in frame.columns:
+        values = frame[col]
+        kind = values.dtype.kind
+        if kind == 'b' or (kind in 'iuf' and values.isin([0, 1]).all()
+                           and col not in NUMERICAL):
+            values = values.astype(np.uint8)
+        elif kind == 'f':
+            values = values.astype(np.float32)
+        elif kind in 'iu':
+            values = pd.to_numeric(values, downcast='unsigned' if values.min() >= 0 else 'integer')
+        elif kind in 'OU' or pd.api.types.is_string_dtype(values.dtype):
+            values = values.astype('category')
+        columns[col] = values
+    compact = pd.DataFrame(columns, index=frame.index)
+
+    before = frame.memory_usage(index=False, deep=True)
+    after = compact.memory_usage(index=False, deep=True)
+    report = pd.DataFrame({'dtype_before': frame.dtypes.astype(str),
+                           'dtype_after': compact.dtypes.astype(str),
+                           'bytes_before': before,
+                           'bytes_after': after,
+                           'bytes_saved': before - after})
+    return compact, report
+
+
+###########################################
+# Chunked preprocessing for inputs larger than memory
+###########################################
+
+def iter_chunks(path, chunksize=1000000):
+    '''
+    Yields the census csv in frames of at most 'chunksize' rows, parsed with SCHEMA.
+    '''
+
+    for chunk in pd.read_csv(path, dtype=SCHEMA, chunksize=chunksize):
+        yield chunk
+
+
+def fit_frame(features):
+    '''
+    What the preprocessing has to know about one in-memory frame of raw features.
+
+    Returns a dict with the min and max of every numerical column (after the log transform of the
+    SKEWED columns, as the MinMaxScaler sees them) and the sorted vocabulary of every categorical
+    column.
+    '''
+
+    stats = {'min': {}, 'max': {}, 'vocab': {}}
+    for col in NUMERICAL:
+        values = features[col].to_numpy(dtype=np.float64)
+        if col in SKEWED:
+            values = np.log1p(values)
+        stats['min'][col] = float(values.min())
+        stats['max'][col] = float(values.max())
+    for col in CATEGORICAL:
+        stats['vocab'][col] = sorted(features[col].dropna().unique())
+    return stats
+
+
+def merge_stats(a, b):
+    '''
+    Combines the stats of two disjoint parts of a dataset into the stats of their union.
+    '''
+
+    return {
+        'min': {col: min(a['min'][col], b['min'][col]) for col in NUMERICAL},
+        'max': {col: max(a['max'][col], b['max'][col]) for col in NUMERICAL},
+        'vocab': {col: sorted(set(a['vocab'][col]) | set(b['vocab'][col])) for col in CATEGORICAL},
+    }
+
+
+def fit_chunked(path, chunksize=1000000):
+    '''
+    First pass over the csv: fit_frame over the whole dataset, holding one chunk in memory at a time.
+    '''
+
+    stats = None
+    for chunk in iter_chunks(path, chunksize):
+        chunk_stats = fit_frame(chunk)
+        stats = chunk_stats if stats is None else merge_stats(stats, chunk_stats)
+    return stats
+
+
+def encoded_columns(stats):
+    '''
+    Column names of the encoded matrix, in the same order pd.get_dummies produces them.
+    '''
+
+    columns = list(NUMERICAL)
+    for col in CATEGORICAL:
+        columns += ["{}_{}".format(col, value) for value in stats['vocab'][col]]
+    return columns
+
+
+def transform_chunk(chunk, stats):
+    '''
+    Applies the log transform, the min-max scaling and the one-hot encoding to one chunk using the
+    statistics from fit_chunked. Categories outside the vocabulary encode as all zeros, so every
+    chunk gets the same columns.
+    '''
+
+    numeric, _, _ = log_minmax(chunk, [stats['min'][col] for col in NUMERICAL],
+                               [stats['max'][col] for col in NUMERICAL])
+    numerics = pd.DataFrame(numeric, columns=NUMERICAL, index=chunk.index, copy=False)
+
+    encoder = SparseEncoder.from_stats(stats)
+    dummies = pd.DataFrame(encoder.dummies(chunk), columns=encoder.columns[len(NUMERICAL):],
+                           index=chunk.index, copy=False)
+
+    features = pd.concat([numerics, dummies], axis=1)
+    return features
+
+
+def preprocess_chunked(path, out_dir, chunksize=1000000, stats=None):
+    '''
+    Two-pass preprocessing of a census csv that does not fit in memory.
+
+    The first pass (skipped when 'stats' is given) runs fit_chunked; the second transforms each
+    chunk and writes it to 'out_dir' as part-NNNNN.feather, with the 0/1 income label in an
+    'income' column. Peak memory depends on 'chunksize', not on the size of the csv.
+
+    Returns the stats and the list of written part files.
+    '''
+
+    if stats is None:
+        stats = fit_chunked(path, chunksize)
+
+    os.makedirs(out_dir, exist_ok=True)
+    parts = []
+    for i, chunk in enumerate(iter_chunks(path, chunksize)):
+        features_raw, income = split_target(chunk)
+        features = transform_chunk(features_raw, stats)
+        features[TARGET] = income.to_numpy()
+        part = os.path.join(out_dir, "part-{:05d}.feather".format(i))
+        features.reset_index(drop=True).to_feather(part)
+        parts.append(part)
+
+    return stats, parts
+
+
+def read_parts(parts):
+    '''
+    Yields (features, income) for each part file written by preprocess_chunked.
+    '''
+
+    for part in parts:
+        frame = pd.read_feather(part)
+        yield frame.drop(TARGET, axis=1), frame[TARGET]
+
+
+###########################################
+# In-place numeric transform kernel
+###########################################
+
+# Rows per segment of the fused pass; a float32 segment this size stays in L1/L2 between the ufuncs
+KERNEL_BLOCK_ROWS = 16384
+
+
+def numeric_block(features, out=None):
+    '''
+    Copies the NUMERICAL columns of 'features' into one float32 block of shape (n_rows, 5), in
+    Fortran order so every column is contiguous. This is the only copy the numeric transforms
+    make, and 'features' is only ever read. Pass a block from an earlier batch of the same
+    length as 'out' to reuse its memory.
+    '''
+
+    shape = (len(features), len(NUMERICAL))
+    if out is None:
+        out = np.empty(shape, dtype=np.float32, order='F')
+    elif out.shape != shape or out.dtype != np.float32 or not out.flags.f_contiguous:
+        raise ValueError("out must be a Fortran-ordered float32 array of shape {}".format(shape))
+    for j, col in enumerate(NUMERICAL):
+        out[:, j] = features[col].to_numpy()
+    return out
+
+
+def log_minmax_inplace(block, data_min=None, data_max=None):
+    '''
+    log1p of the SKEWED columns and min-max scaling of every column of a numeric_block, written
+    over 'block' itself; no temporary the size of a column is allocated.
+
+    With 'data_min'/'data_max' given (e.g. from fit_frame), each column is transformed in one
+    fused pass over cache-sized segments: log1p, then x * scale + shift, as MinMaxScaler computes
+    it. Without them the min/max are fitted on the block after the log, which costs one extra
+    pass.
+
+    Returns the block and the min and max of every column (float64, in NUMERICAL order).
+    '''
+
+    skewed = [j for j, col in enumerate(NUMERICAL) if col in SKEWED]
+    if data_min is None or data_max is None:
+        for j in skewed:
+            np.log1p(block[:, j], out=block[:, j])
+        data_min = block.min(axis=0).astype(np.float64)
+        data_max = block.max(axis=0).astype(np.float64)
+        skewed = []
+    else:
+        data_min = np.asarray(data_min, dtype=np.float64)
+        data_max = np.asarray(data_max, dtype=np.float64)
+
+    span = data_max - data_min
+    span[span == 0.0] = 1.0
+    scale = (1.0 / span).astype(np.float32)
+    shift = (-data_min / span).astype(np.float32)
+
+    for j in range(block.shape[1]):
+        column = block[:, j]
+        for start in range(0, len(column), KERNEL_BLOCK_ROWS):
+            segment = column[start:start + KERNEL_BLOCK_ROWS]
+            if j in skewed:
+                np.log1p(segment, out=segment)
+            np.multiply(segment, scale[j], out=segment)
+            np.add(segment, shift[j], out=segment)
+    return block, data_min, data_max
+
+
+def log_minmax(features, data_min=None, data_max=None, out=None):
+    '''
+    The notebook's log transform and MinMaxScaler on the NUMERICAL columns of 'features' as one
+    float32 block: numeric_block, then log_minmax_inplace. 'features' is left untouched.
+    '''
+
+    return log_minmax_inplace(numeric_block(features, out), data_min, data_max)
+
+
+###########################################
+# Sparse one-hot encoding with a frozen vocabulary
+###########################################
+
+class SparseEncoder(object):
+    '''
+    One-hot encodes the categorical census columns, into a scipy.sparse CSR matrix (transform)
+    or a dense uint8 block (dummies). It is the one encoder of the package: transform_chunk and
+    DonorPipeline.transform both go through its codes().
+
+    The vocabulary is learned once by fit (or taken from fit_chunked stats) and then frozen, so
+    every batch transformed later gets the same column layout as training, even when a category
+    is missing from the batch; unseen categories encode as all zeros. The numerical columns are
+    passed through as they are (already log-transformed and scaled) and, like pd.get_dummies,
+    come first in the layout.
+    '''
+
+    def __init__(self, vocab=None):
+        self.vocab = vocab
+
+    @classmethod
+    def from_stats(cls, stats):
+        return cls({col: list(values) for col, values in stats['vocab'].items()})
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f)['vocab'])
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'vocab': self.vocab}, f)
+
+    def fit(self, features):
+        self.vocab = {col: sorted(features[col].dropna().unique()) for col in CATEGORICAL}
+        return self
+
+    @property
+    def columns(self):
+        return encoded_columns({'vocab': self.vocab})
+
+    def codes(self, features):
+        '''
+        For every record and categorical column, the index of the record's dummy in 'columns'
+        (the numerical columns come first), or -1 for a category outside the vocabulary.
+        '''
+
+        codes = np.empty((len(features), len(CATEGORICAL)), dtype=np.int64)
+        offset = len(NUMERICAL)
+        for j, col in enumerate(CATEGORICAL):
+            vocab = pd.Index(self.vocab[col])
+            col_codes = vocab.get_indexer(features[col].astype(object))
+            codes[:, j] = np.where(col_codes >= 0, col_codes + offset, -1)
+            offset += len(vocab)
+        return codes
+
+    def dummies(self, features):
+        '''
+        The dummy columns alone, as a dense uint8 array of shape (n_records, n_dummies).
+        '''
+
+        codes = self.codes(features)
+        known = codes >= 0
+        out = np.zeros((len(features), len(self.columns) - len(NUMERICAL)), dtype=np.uint8)
+        rows = np.repeat(np.arange(len(features)), len(CATEGORICAL)).reshape(codes.shape)[known]
+        out[rows, codes[known] - len(NUMERICAL)] = 1
+        return out
+
+    def transform(self, features):
+        '''
+        Returns a float32 CSR matrix with one row per record of 'features'.
+        '''
+
+        n_rows = len(features)
+        numeric = sparse.csr_matrix(features[NUMERICAL].to_numpy(dtype=np.float32))
+
+        # Each record has at most one non-zero per categorical column
+        codes = self.codes(features)
+        known = codes >= 0
+        rows = np.repeat(np.arange(n_rows), len(CATEGORICAL)).reshape(codes.shape)[known]
+        dummies = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, codes[known] - len(NUMERICAL))),
+            shape=(n_rows, len(self.columns) - len(NUMERICAL)))
+
+        return sparse.hstack([numeric, dummies], format='csr', dtype=np.float32)
+
+    def fit_transform(self, features):
+        return self.fit(features).transform(features)
+
+
+###########################################
+# uint8 pre-binning for histogram-based boosting
+###########################################
+
+class FeatureBinner(object):
+    '''
+    Maps the raw census features to a compact uint8 frame that histogram-based boosting learners
+    train on directly: each numerical column becomes the index of its quantile bin (at most
+    'n_bins' bins, edges learned once by fit) and each categorical column the code of its
+    category in a frozen vocabulary. No log-transform, scaling or get_dummies is needed, since
+    bins only depend on the order of the values and categoricals stay one column each.
+
+    Unseen categories encode as 'n_bins', which HistGradientBoostingClassifier(max_bins=n_bins)
+    treats as an unknown category at predict time.
+    '''
+
+    def __init__(self, n_bins=255, subsample=200000, random_state=0):
+        self.n_bins = n_bins
+        self.subsample = subsample
+        self.random_state = random_state
+
+    def fit(self, features):
+        rng = np.random.RandomState(self.random_state)
+        sample = features
+        if self.subsample is not None and len(features) > self.subsample:
+            sample = features.iloc[rng.choice(len(features), self.subsample, replace=False)]
+
+        # Like the binner of HistGradientBoosting: midpoints between the distinct values when
+        # there are few of them, quantiles otherwise
+        self.edges = {}
+        for col in NUMERICAL:
+            values = sample[col].dropna().to_numpy(dtype=np.float64)
+            distinct = np.unique(values)
+            if len(distinct) <= self.n_bins:
+                edges = (distinct[:-1] + distinct[1:]) / 2
+            else:
+                quantiles = np.linspace(0, 100, self.n_bins + 1)[1:-1]
+                edges = np.unique(np.percentile(values, quantiles, method='midpoint'))
+            self.edges[col] = edges
+
+        self.vocab = {col: sorted(features[col].dropna().unique()) for col in CATEGORICAL}
+        for col, vocab in self.vocab.items():
+            if len(vocab) > self.n_bins:
+                raise ValueError("{} has {} categories, more than n_bins={}".format(col, len(vocab), self.n_bins))
+        return self
+
+    @property
+    def columns(self):
+        return NUMERICAL + CATEGORICAL
+
+    @property
+    def categorical_mask(self):
+        return np.array([col in CATEGORICAL for col in self.columns])
+
+    def transform(self, features):
+        '''
+        Returns a uint8 DataFrame with the columns NUMERICAL + CATEGORICAL, indexed like 'features'.
+        '''
+
+        binned = {}
+        for col in NUMERICAL:
+            binned[col] = np.searchsorted(self.edges[col], features[col].to_numpy(dtype=np.float64),
+                                          side='left').astype(np.uint8)
+        for col in CATEGORICAL:
+            codes = pd.Index(self.vocab[col]).get_indexer(features[col].astype(object))
+            binned[col] = np.where(codes >= 0, codes, self.n_bins).astype(np.uint8)
+        return pd.DataFrame(binned, index=features.index, columns=self.columns)
+
+    def fit_transform(self, features):
+        return self.fit(features).transform(features)
@@ -0,0 +1,140 @@
+###########################################
+# Memory-mapped on-disk layout of the encoded feature matrix
+#
+#   <directory>/schema.json     column names, number of rows, 'dense' or 'csr'
+#   <directory>/features.npy    float32 matrix (dense)
+#   <directory>/data.npy, indices.npy, indptr.npy   the CSR arrays (sparse)
+#   <directory>/labels.npy      int8 income labels
+###########################################
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import census
+
+SCHEMA_FILE = 'schema.json'
+
+
+def _write_schema(directory, columns, n_rows, layout):
+    with open(os.path.join(directory, SCHEMA_FILE), 'w') as f:
+        json.dump({'columns': list(columns), 'n_rows': int(n_rows), 'layout': layout,
+                   'dtype': 'float32'}, f, indent=1)
+
+
+def write_dataset(directory, features, labels, columns=None, block_rows=100000):
+    '''
+    Writes the encoded matrix (e.g. features_final, or a SparseEncoder CSR matrix) and the income
+    labels once, so later runs open them with np.load(mmap_mode='r') instead of rebuilding them.
+
+    Dense input is copied into features.npy 'block_rows' rows at a time, so the float32 copy of
+    the whole matrix never has to exist in memory.
+    '''
+
+    os.makedirs(directory, exist_ok=True)
+    if columns is None:
+        columns = list(features.columns)
+    n_rows = features.shape[0]
+
+    if sparse.issparse(features):
+        features = features.tocsr()
+        np.save(os.path.join(directory, 'data.npy'), features.data.astype(np.float32, copy=False))
+        np.save(os.path.join(directory, 'indices.npy'), features.indices)
+        np.save(os.path.join(directory, 'indptr.npy'), features.indptr)
+        layout = 'csr'
+    else:
+        out = np.lib.format.open_memmap(os.path.join(directory, 'features.npy'), mode='w+',
+                                        dtype=np.float32, shape=(n_rows, len(columns)))
+        for start in range(0, n_rows, block_rows):
+            block = features[start:start + block_rows]
+            out[start:start + len(block)] = np.asarray(block, dtype=np.float32)
+        out.flush()
+        del out
+        layout = 'dense'
+
+    np.save(os.path.join(directory, 'labels.npy'), np.asarray(labels, dtype=np.int8))
+    _write_schema(directory, columns, n_rows, layout)
+
+
+def write_dataset_from_parts(directory, parts):
+    '''
+    Writes the dense layout from the part files of census.preprocess_chunked, one part at a time.
+    '''
+
+    import pyarrow.feather as feather
+
+    n_rows = sum(feather.read_table(part, memory_map=True).num_rows for part in parts)
+    os.makedirs(directory, exist_ok=True)
+    out = labels = columns = None
+    start = 0
+    for features, income in census.read_parts(parts):
+        if out is None:
+            columns = list(features.columns)
+            out = np.lib.format.open_memmap(os.path.join(directory, 'features.npy'), mode='w+',
+                                            dtype=np.float32, shape=(n_rows, len(columns)))
+            labels = np.lib.format.open_memmap(os.path.join(directory, 'labels.npy'), mode='w+',
+                                               dtype=np.int8, shape=(n_rows,))
+        out[start:start + len(features)] = features.to_numpy(dtype=np.float32)
+        labels[start:start + len(features)] = income.to_numpy()
+        start += len(features)
+    out.flush()
+    labels.flush()
+    _write_schema(directory, columns, n_rows, 'dense')
+
+
+class Dataset(object):
+    '''
+    The encoded matrix and labels opened read-only through memory maps.
+
+    Opening is close to instant whatever the size, and processes opening the same directory share
+    the page cache. Splits are index arrays into X and y, drawn with splits.stratified_split(ds.y);
+    rows are only copied by whoever takes them (take(), or a learner's fit).
+    '''
+
+    def __init__(self, directory, mmap_mode='r'):
+        with open(os.path.join(directory, SCHEMA_FILE)) as f:
+            schema = json.load(f)
+        self.directory = directory
+        self.columns = schema['columns']
+        self.layout = schema['layout']
+
+        def load(name):
+            return np.load(os.path.join(directory, name), mmap_mode=mmap_mode)
+
+        if self.layout == 'csr':
+            self.X = sparse.csr_matrix((load('data.npy'), load('indices.npy'), load('indptr.npy')),
+                                       shape=(schema['n_rows'], len(self.columns)), copy=False)
+        else:
+            self.X = load('features.npy')
+        self.y = load('labels.npy')
+
+    def __len__(self):
+        return self.X.shape[0]
+
+    def storage_report(self):
+        '''
+        Bytes every column takes on disk, next to what it would take as a column of a dense
+        float32 matrix. In the CSR layout a column costs one float32 value and one column index
+        per non-zero, so a 0/1 dummy costs 8 bytes per record that has it instead of 4 bytes
+        per record (the CSR row pointers, one per record, come on top).
+        '''
+
+        n_rows = len(self)
+        dense = np.full(len(self.columns), 4 * n_rows, dtype=np.int64)
+        if self.layout == 'csr':
+            per_nonzero = self.X.data.dtype.itemsize + self.X.indices.dtype.itemsize
+            stored = np.bincount(self.X.indices, minlength=len(self.columns)) * per_nonzero
+        else:
+            stored = np.full(len(self.columns), self.X.dtype.itemsize * n_rows, dtype=np.int64)
+        return pd.DataFrame({'bytes_dense': dense, 'bytes_stored': stored, 'bytes_saved': dense - stored},
+                            index=pd.Index(self.columns, name='column'))
+
+    def take(self, index):
+        return self.X[index], np.asarray(self.y[index])
+
+
+def open_dataset(directory, mmap_mode='r'):
+    return Dataset(directory, mmap_mode)
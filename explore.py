@@ -0,0 +1,187 @@
+###########################################
+# Constant-memory exploration statistics in one streaming pass
+###########################################
+
+import math
+
+import numpy as np
+import pandas as pd
+
+import census
+
+# Fixed histogram ranges of the skewed features, so the bins are known before the first chunk
+SKEWED_RANGES = {'capital-gain': (0.0, 100000.0), 'capital-loss': (0.0, 4500.0)}
+
+
+class StreamingHistogram(object):
+    '''
+    A histogram with 'n_bins' fixed, equal-width bins over [lo, hi], updated chunk by chunk.
+
+    Bin counts are exact; values outside the range are counted in 'underflow'/'overflow'. The
+    count, sum, min, max and number of exact zeros are tracked exactly as well, so the mean is
+    exact and only statistics read off the bins (quantiles) carry an error, of at most one bin
+    width. The zeros are a point mass of their own in the quantiles, so on a zero-dominated
+    feature like capital-gain the median is exactly 0 rather than a point inside the first bin.
+    '''
+
+    def __init__(self, lo, hi, n_bins=25):
+        self.edges = np.linspace(lo, hi, n_bins + 1)
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+        self.count = 0
+        self.zeros = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def bin_width(self):
+        return self.edges[1] - self.edges[0]
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else float('nan')
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.counts += np.histogram(values, bins=self.edges)[0]
+        self.underflow += int(np.count_nonzero(values < self.edges[0]))
+        self.overflow += int(np.count_nonzero(values > self.edges[-1]))
+        self.count += len(values)
+        self.zeros += int(len(values) - np.count_nonzero(values))
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        return self
+
+    def quantile(self, q):
+        '''
+        Returns the q-quantile, interpolated within its bin, and the bound on its error.
+        '''
+
+        rank = q * self.count
+        if rank <= self.underflow:
+            return self.min, self.edges[0] - self.min
+        if rank > self.count - self.overflow:
+            return self.max, self.max - self.edges[-1]
+
+        # (lo, hi, count) pieces in value order: the bins, with the one holding 0 split around the
+        # zeros; its other values are assumed spread evenly over the bin
+        pieces = [(lo, hi, count) for lo, hi, count in zip(self.edges[:-1], self.edges[1:], self.counts)]
+        if self.zeros and self.edges[0] <= 0 <= self.edges[-1]:
+            j = min(int(np.searchsorted(self.edges, 0, side='right')) - 1, len(self.counts) - 1)
+            lo, hi, count = pieces[j]
+            others = count - self.zeros
+            below = others * (0 - lo) / (hi - lo)
+            pieces[j:j + 1] = [(lo, 0.0, below), (0.0, 0.0, self.zeros), (0.0, hi, others - below)]
+
+        before = self.underflow
+        for lo, hi, count in pieces:
+            if count and rank <= before + count:
+                value = lo + (rank - before) / count * (hi - lo)
+                return min(max(value, self.min), self.max), hi - lo
+            before += count
+        return self.edges[-1], self.bin_width
+
+
+class ExplorationSummary(object):
+    '''
+    What the exploration section needs to know about a dataset, gathered by explore():
+
+       - n_records and class_counts, exact
+       - histograms: a StreamingHistogram per skewed feature
+       - sample: a uniform random sample of the records (reservoir sampling), for display() and
+         for the plotting functions, e.g. vs.distribution(summary.sample)
+    '''
+
+    def __init__(self, n_records, class_counts, histograms, sample):
+        self.n_records = n_records
+        self.class_counts = class_counts
+        self.histograms = histograms
+        self.sample = sample
+
+    @property
+    def greater_percent(self):
+        return self.class_counts.get('>50K', 0) / float(self.n_records) if self.n_records else 0.0
+
+    def sample_error(self, p, z=1.96):
+        '''
+        Half-width of the (default 95%) confidence interval of a proportion 'p' estimated from the
+        sample, with the finite population correction.
+        '''
+
+        k = len(self.sample)
+        if k == 0:
+            return float('nan')
+        correction = math.sqrt((self.n_records - k) / float(self.n_records - 1)) if self.n_records > 1 else 0.0
+        return z * math.sqrt(p * (1 - p) / k) * correction
+
+    def report(self):
+        lines = ["Records: {} (exact)".format(self.n_records)]
+        for label, count in sorted(self.class_counts.items()):
+            lines.append("  income {}: {} ({:.2f}%)".format(label, count, 100.0 * count / self.n_records))
+
+        sample_greater = float((self.sample[census.TARGET] == '>50K').mean()) if len(self.sample) else float('nan')
+        lines.append("Sample of {} records: {:.2f}% making more than $50,000 (+/- {:.2f}% at 95%)".format(
+            len(self.sample), 100.0 * sample_greater, 100.0 * self.sample_error(sample_greater)))
+
+        for col, hist in self.histograms.items():
+            median, error = hist.quantile(0.5)
+            p99, error_99 = hist.quantile(0.99)
+            lines.append("{}: mean {:.1f} (exact), median {:.1f} (+/- {:.1f}), p99 {:.1f} (+/- {:.1f}), "
+                         "{:.2f}% zeros (exact), {} out of range".format(
+                             col, hist.mean, median, error, p99, error_99,
+                             100.0 * hist.zeros / hist.count if hist.count else 0.0,
+                             hist.underflow + hist.overflow))
+        return '\n'.join(lines)
+
+
+def explore(path="census.csv", sample_size=10000, ranges=SKEWED_RANGES, n_bins=25, chunksize=1000000,
+            random_state=0):
+    '''
+    Summarizes a census csv of any size in one streaming pass, holding at most one chunk plus the
+    sample in memory.
+
+    The sample is a bottom-k reservoir: every record gets a uniform random key and the
+    'sample_size' records with the smallest keys seen so far are kept, which is a uniform sample
+    without replacement of the whole file once the pass is over.
+
+    inputs:
+       - path: the census csv
+       - sample_size: records kept for display and plotting
+       - ranges: (lo, hi) of the fixed histogram bins, per feature
+       - n_bins: bins per histogram
+       - chunksize: rows parsed at a time
+    '''
+
+    rng = np.random.RandomState(random_state)
+    histograms = {col: StreamingHistogram(lo, hi, n_bins) for col, (lo, hi) in ranges.items()}
+    class_counts = {}
+    n_records = 0
+    sample, sample_keys = None, np.empty(0)
+
+    for chunk in census.iter_chunks(path, chunksize):
+        n_records += len(chunk)
+        for label, count in chunk[census.TARGET].value_counts().items():
+            class_counts[label] = class_counts.get(label, 0) + int(count)
+        for col, hist in histograms.items():
+            hist.update(chunk[col].to_numpy())
+
+        keys = rng.random_sample(len(chunk))
+        if sample is not None and len(sample_keys) == sample_size:
+            # Only records that beat the current largest key can enter the reservoir
+            candidates = keys < sample_keys.max()
+            chunk, keys = chunk[candidates], keys[candidates]
+        frames = [chunk] if sample is None else [sample, chunk]
+        merged = pd.concat(frames, ignore_index=True)
+        merged_keys = np.concatenate([sample_keys, keys])
+        keep = np.argsort(merged_keys, kind='stable')[:sample_size]
+        sample, sample_keys = merged.iloc[keep].reset_index(drop=True), merged_keys[keep]
+
+    if sample is None:
+        sample = pd.DataFrame(columns=list(census.SCHEMA))
+    return ExplorationSummary(n_records, class_counts, histograms, sample)
@@ -24,6 +24,7 @@
 
 
 # Import libraries necessary for this project
+import os
 import numpy as np
 import pandas as pd
 from time import time
@@ -31,12 +32,20 @@ from IPython.display import display # Allows the use of display() for DataFrames
 
 # Import supplementary visualization code visuals.py
 import visuals as vs
+import census
+import profiling
+
+# Stage timing follows the environment: start Jupyter with DONORS_PROFILE=1 (and DONORS_PROFILE_MEMORY=1
+# for peak memory) to time every pipeline stage; otherwise the hooks are no-ops
+
+# The timing benchmarks refit and retransform the full data several times; DONORS_BENCHMARK=1 runs them
+run_benchmarks = os.environ.get('DONORS_BENCHMARK') == '1'
 
 # Pretty display for notebooks
 get_ipython().run_line_magic('matplotlib', 'inline')
 
-# Load the Census dataset
-data = pd.read_csv("census.csv")
+# Load the Census dataset (parsed once with explicit dtypes, cached as Feather for later runs)
+data = census.load_census("census.csv")
 
 # Success - Display the first record
 display(data.head(n=5))
@@ -75,6 +84,14 @@ print("Individuals making more than $50,000: {}".format(n_greater_50k))
 print("Individuals making at most $50,000: {}".format(n_at_most_50k))
 print("Percentage of individuals making more than $50,000: {:.2f}%".format(greater_percent*100))
 
+# Exploration mode for extracts too large to load: one constant-memory streaming pass gives the exact
+# class balance and skewed-feature histograms, plus a uniform sample for display and the plots
+import explore
+summary = explore.explore("census.csv", sample_size=10000)
+print(summary.report())
+display(summary.sample.head(n=5))
+vs.distribution(summary.sample)
+
 
 # ** Featureset Exploration **
 # 
@@ -106,12 +123,10 @@ print("Percentage of individuals making more than $50,000: {:.2f}%".format(great
 
 import pandas as pd
 import visuals as vs
-
-data = pd.read_csv("census.csv")
+import census
 
 # Split the data into features and target label
-income = income_raw.replace(['<=50K', '>50K'], [0,1])
-features_raw = data.drop('income', axis = 1)
+features_raw, income = census.split_target(data)
 
 # Visualize skewed continuous features of original data
 vs.distribution(data)
@@ -126,10 +141,11 @@ vs.distribution(data)
 
 import pandas as pd
 
-# Log-transform the skewed features
+# Log-transform the skewed features: census.log_minmax with a [0, 1] range for every column is
+# log1p on the skewed columns and the identity on the others, on one float32 copy of the numerics
 skewed = ['capital-gain', 'capital-loss']
-features_log_transformed = pd.DataFrame(data = features_raw)
-features_log_transformed[skewed] = features_raw[skewed].apply(lambda x: np.log(x + 1))
+numeric, _, _ = census.log_minmax(features_raw, np.zeros(len(census.NUMERICAL)), np.ones(len(census.NUMERICAL)))
+features_log_transformed = pd.DataFrame(numeric, columns = census.NUMERICAL, index = features_raw.index, copy = False)
 
 # Visualize the new log distributions
 vs.distribution(features_log_transformed, transformed = True)
@@ -147,6 +163,7 @@ vs.distribution(features_log_transformed, transformed = True)
 import pandas as pd
 import numpy as np
 import visuals as vs
+import census
 get_ipython().run_line_magic('matplotlib', 'inline')
 
 from time import time
@@ -154,7 +171,7 @@ from IPython.display import display
 
 from sklearn.preprocessing import MinMaxScaler
 
-data = pd.read_csv("census.csv")
+data = census.load_census("census.csv")
 
 vs.distribution(data)
 
@@ -164,18 +181,19 @@ features_raw = data.drop('income', axis = 1)
 
 skewed = ['capital-gain', 'capital-loss']
 
-features_log_transformed = pd.DataFrame(data = features_raw)
-features_log_transformed[skewed] = features_raw[skewed].apply(lambda x: np.log(x + 1))
-
-# Initialize a scaler, then apply it to the features
+# Initialize a scaler, then apply it to the features: the log transform and the min-max scaling in
+# one pass of census.log_minmax, with a MinMaxScaler holding the min/max it fitted
 scaler = MinMaxScaler()
 numerical = ['age', 'education-num', 'capital-gain', 'capital-loss', 'hours-per-week']
 
-features_log_minmax_transform = pd.DataFrame(data = features_log_transformed)
-features_log_minmax_transform[numerical] = scaler.fit_transform(features_log_transformed[numerical])
+numeric, data_min, data_max = census.log_minmax(features_raw)
+scaler.fit(np.vstack([data_min, data_max]))
+features_log_minmax_transform = pd.concat(
+    [pd.DataFrame(numeric, columns = numerical, index = features_raw.index, copy = False),
+     features_raw[census.CATEGORICAL]], axis = 1)
 
 # Show an example of a record with scaling applied
-display(features_log_minmax_transform.head(n = 5))
+display(features_log_minmax_transform.head(n = 5)[list(features_raw.columns)])
 
 
 # ### Implementation: Data Preprocessing
@@ -199,6 +217,8 @@ display(features_log_minmax_transform.head(n = 5))
 import pandas as pd
 import numpy as np
 import visuals as vs
+import census
+import profiling
 
 from sklearn.preprocessing import MinMaxScaler
 
@@ -209,7 +229,7 @@ scaler = MinMaxScaler()
 
 # TODO: One-hot encode the 'features_log_minmax_transform' data using pandas.get_dummies()
 
-data = pd.read_csv("census.csv")
+data = census.load_census("census.csv")
 
 numerical = ['age', 'education-num', 'capital-gain', 'capital-loss', 'hours-per-week']
 
@@ -218,18 +238,58 @@ features_raw = data.drop('income', axis = 1)
 
 skewed = ['capital-gain', 'capital-loss']
 
-features_log_transformed = pd.DataFrame(data = features_raw)
-features_log_transformed[skewed] = features_raw[skewed].apply(lambda x: np.log(x + 1))
-features_log_minmax_transform = pd.DataFrame(data = features_log_transformed)
-features_log_minmax_transform[numerical] = scaler.fit_transform(features_log_transformed[numerical])
-
-features_final = pd.get_dummies(features_log_minmax_transform)
+# Log transform and min-max scaling in place on one float32 copy of the numerical columns;
+# features_raw itself is never written to
+with profiling.stage('log_minmax'):
+    numeric, data_min, data_max = census.log_minmax(features_raw)
+    features_log_minmax_transform = pd.concat(
+        [pd.DataFrame(numeric, columns = numerical, index = features_raw.index, copy = False),
+         features_raw[census.CATEGORICAL]], axis = 1)
+
+# A MinMaxScaler holding the same min/max, for DonorPipeline.from_fitted
+scaler.fit(np.vstack([data_min, data_max]))
+
+# Store the features compactly: float32 scaled numerics, categorical strings (load_census already
+# parses with the compact census.SCHEMA dtypes, so the per-column report mostly confirms it; the
+# large saving is in the encoded matrix below)
+features_log_minmax_transform, dtype_report = census.downcast(features_log_minmax_transform)
+print("Downcasting saved {:.1f} MB of {:.1f} MB".format(dtype_report['bytes_saved'].sum() / 1024.0 ** 2,
+                                                      dtype_report['bytes_before'].sum() / 1024.0 ** 2))
+display(dtype_report.sort_values('bytes_saved', ascending=False).head(n = 10))
+
+# One-hot encode into a float32 CSR matrix with pd.get_dummies' column layout: the vocabulary is
+# learned once and frozen, and only the non-zeros of the ~100 mostly-zero columns are stored
+with profiling.stage('one_hot'):
+    encoder = census.SparseEncoder().fit(features_raw)
+    features_final = encoder.transform(features_log_minmax_transform)
+
+# Against the DataFrame.apply + MinMaxScaler path it replaces
+import benchmark
+if run_benchmarks:
+    numeric_timings = benchmark.numeric_transform_benchmark(features_raw)
 
 
 # Print the number of features after one-hot encoding
-encoded = list(features_final.columns)
+encoded = encoder.columns
 print ( "{} total features after one-hot encoding.".format(len(encoded)))
 
+# Keep the encoded matrix on disk as memory-mapped CSR arrays, so training, evaluation and
+# scoring runs can open it with dataset.open_dataset("donors_dataset") instead of rebuilding it
+import dataset
+dataset.write_dataset("donors_dataset", features_final, income, columns = encoded)
+
+# Bytes per column on disk: the dummies only store their non-zeros instead of a float32 per record
+storage_report = dataset.open_dataset("donors_dataset").storage_report()
+print("The encoded matrix takes {:.1f} MB on disk instead of {:.1f} MB as dense float32".format(
+    storage_report['bytes_stored'].sum() / 1024.0 ** 2, storage_report['bytes_dense'].sum() / 1024.0 ** 2))
+display(storage_report.sort_values('bytes_saved', ascending=False).head(n = 10))
+
+# The model must not notice the sparse storage (checked on a sample, to keep the dense copy small)
+from sklearn.linear_model import LogisticRegression
+check_rows = np.arange(min(len(income), 20000))
+benchmark.compare_fbeta(LogisticRegression(random_state=0), features_final[check_rows].toarray(),
+                        features_final[check_rows], income.iloc[check_rows])
+
 
 
 # ### Shuffle and Split Data
@@ -242,19 +302,23 @@ print ( "{} total features after one-hot encoding.".format(len(encoded)))
 
 import pandas as pd
 
-# Import train_test_split
-from sklearn.cross_validation import train_test_split
+# Stratified, index-based splitting: one split serves the whole sweep and the search folds
+import splits
 
-# Split the 'features' and 'income' data into training and testing sets
+# Reopen the encoded matrix written above; training and evaluation read it through the memory map,
+# as a CSR matrix: LogisticRegression and the tree ensembles train on it directly
+ds = dataset.open_dataset("donors_dataset")
+X, y = ds.X, ds.y
 
-X_train, X_test, y_train, y_test = train_test_split(features_final, 
-                                                    income, 
-                                                    test_size = 0.2, 
-                                                    random_state = 0)
+# Split the 'features' and 'income' data into training and testing sets: index arrays into X and y,
+# every fit or prediction below takes only the rows it needs (only the small int8 test labels are kept)
+with profiling.stage('train_test_split'):
+    split = splits.stratified_split(y, test_size = 0.2, n_folds = 3, random_state = 0)
+    y_test = np.asarray(y[split.test])
 
 # Show the results of the split
-print("Training set has {} samples.".format(X_train.shape[0]))
-print("Testing set has {} samples.".format(X_test.shape[0]))
+print("Training set has {} samples.".format(len(split.train)))
+print("Testing set has {} samples.".format(len(split.test)))
 
 
 # ----
@@ -308,21 +372,15 @@ FP = income.count() - TP # Specific to the naive case
 TN = 0 # No predicted negatives in the naive case
 FN = 0 # No predicted negatives in the naive case
 '''
-from sklearn.metrics import confusion_matrix
-from sklearn.metrics import accuracy_score
+import metrics
 
 #naive classifier
 y_pred = income.replace(0,1)
 
-#confusion matrix
-cm = confusion_matrix(income,y_pred)
+#confusion counts, in one bincount pass over the labels
+tn, fp, fn, tp = metrics.confusion_counts(income, y_pred)
 
 #metrics
-tn = cm[0,0]
-fp = cm[0,1]
-fn = cm[1,0]
-tp = cm[1,1]
-
 recall = tp / (tp + fn)
 precision = tp / (tp + fp)
 
@@ -423,54 +481,63 @@ print ("Naive Predictor: [Accuracy score: {:.4f}, F-score: {:.4f}]".format(accur
 # In[22]:
 
 
-from sklearn.metrics import accuracy_score, fbeta_score #metrics / scoring
+import metrics #metrics / scoring
 from sklearn.naive_bayes import GaussianNB
 from time import time
+from model_cache import ModelCache
+import training
+
+# Fitted learners are cached on disk, so rerunning the notebook doesn't retrain them
+model_cache = ModelCache(".model_cache")
 
-def train_predict(learner, sample_size, X_train, y_train, X_test, y_test):
+def train_predict(learner, sample_size, X, y, train, test, cache=None):
     '''
     inputs:
        - learner: the learning algorithm to be trained and predicted on
        - sample_size: the size of samples (number) to be drawn from training set
-       - X_train: features training set
-       - y_train: income training set
-       - X_test: features testing set
-       - y_test: income testing set
+       - X: features of all records (e.g. the memory-mapped ds.X)
+       - y: income of all records
+       - train: training set row indices into X and y
+       - test: testing set row indices into X and y
+       - cache: optional ModelCache, reuses a learner already fitted on the same slice
     '''
 
     results = {}
 
     # Fit the learner to the training data using slicing with 'sample_size'
+    # (CSR rows are only densified for learners that need it, i.e. GaussianNB)
+    X_fit, y_fit = training.take_rows(learner, X, train[:sample_size]), y[train[:sample_size]]
     start = time() # Get start time
-    learner = learner.fit(X_train[:sample_size], y_train[:sample_size]) #sample_weight=sample_size
+    with profiling.stage('fit'):
+        if cache is None:
+            learner = learner.fit(X_fit, y_fit) #sample_weight=sample_size
+        else:
+            learner = cache.fit(learner, X_fit, y_fit)
     end = time() # Get end time
 
-    # Calculate the training time
-    results['train_time'] = (end - start)
+    # Calculate the training time (for a cache hit, the time the original fit took)
+    results['train_time'] = (end - start) if cache is None else cache.last_fit_seconds
 
     # Get the predictions on the test set,
     #       then get predictions on the first 300 training samples
     start = time() # Get start time
-    predictions_test = learner.predict(X_test) #pred = clf.predict(features_test)
-    predictions_train = learner.predict(X_train[:300])
+    with profiling.stage('predict'):
+        predictions_test = learner.predict(training.take_rows(learner, X, test)) #pred = clf.predict(features_test)
+        predictions_train = learner.predict(training.take_rows(learner, X, train[:300]))
     end = time() # Get end time
 
     # Total prediction time
     results['pred_time'] = (end - start)
 
-    # Compute accuracy on 300 training samples
-    results['acc_train'] = accuracy_score(y_train[:300], predictions_train)
+    # Compute accuracy and F-score on 300 training samples, one pass over the labels
+    scores_train = metrics.binary_scores(y[train[:300]], predictions_train, betas=(.5,))
+    results['acc_train'] = scores_train['accuracy']
+    results['f_train'] = scores_train['f0.5']
 
-    # Compute accuracy on test set
-    results['acc_test']  = accuracy_score(y_test, predictions_test)
-
-
-    # Compute F-score on 300 training samples
-    results['f_train'] = fbeta_score(y_train[:300], predictions_train, beta=.5)
-
-
-    # Compute F-score on the test set
-    results['f_test'] = fbeta_score(y_test, predictions_test, beta=.5)
+    # Compute accuracy and F-score on the test set
+    scores_test = metrics.binary_scores(y[test], predictions_test, betas=(.5,))
+    results['acc_test'] = scores_test['accuracy']
+    results['f_test'] = scores_test['f0.5']
 
     # Success
     print ("{} trained on {} samples.".format(learner.__class__.__name__, sample_size))
@@ -478,7 +545,7 @@ def train_predict(learner, sample_size, X_train, y_train, X_test, y_test):
     # Return the results
     return results
 
-train_predict(GaussianNB(), 36177, X_train, y_train,X_test, y_test)
+train_predict(GaussianNB(), 36177, X, y, split.train, split.test)
 
 
 # ### Implementation: Initial Model Evaluation
@@ -508,20 +575,35 @@ clf_C = RandomForestClassifier(random_state = 0)
 
 
 # Calculate the number of samples for 1%, 10%, and 100% of the training data
-samples_1 = X_train.shape[0]*0.01; samples_1 = int(samples_1)
-samples_10 = X_train.shape[0]*0.1; samples_10 = int(samples_10)
-samples_100 = X_train.shape[0]; samples_100 = int(samples_100)
-
-# Collect results on the learners
-results = {}
-for clf in [clf_A, clf_B, clf_C]:
-    clf_name = clf.__class__.__name__
-    results[clf_name] = {}
-    for i, samples in enumerate([samples_1, samples_10, samples_100]):
-        results[clf_name][i] =         train_predict(clf, samples, X_train, y_train, X_test, y_test)
+# (split.train is in stratified order, so split.train[:samples_1] is a stratified 1% slice)
+samples_1 = split.sample_size(0.01)
+samples_10 = split.sample_size(0.1)
+samples_100 = split.sample_size(1.0)
+
+# Collect results on the learners, fitting every (learner, sample size) pair in parallel
+import training
+results = training.parallel_sweep(train_predict, [clf_A, clf_B, clf_C],
+                                  [samples_1, samples_10, samples_100],
+                                  X, y, split.train, split.test, cache=model_cache)
+
+# A fourth learner, histogram-based gradient boosting, trained on the raw features pre-binned
+# once to uint8 (bin edges and category codes learned on the training rows, no get_dummies)
+binner = census.FeatureBinner(n_bins=255).fit(features_raw.iloc[split.train])
+features_binned = binner.transform(features_raw)
+Xb = features_binned.to_numpy()
+clf_D = training.hist_boosting(binner, random_state = 0)
+results.update(training.parallel_sweep(train_predict, [clf_D], [samples_1, samples_10, samples_100],
+                                       Xb, y, split.train, split.test, cache=model_cache))
+print(model_cache.report())
 
 # Run metrics visualization for the three supervised learning models chosen
-vs.evaluate(results, accuracy, fscore)
+vs.evaluate({name: results[name] for name in ['GaussianNB', 'LogisticRegression', 'RandomForestClassifier']},
+            accuracy, fscore)
+
+# and for the boosted learner next to the two strongest of them
+vs.evaluate({name: results[name] for name in ['LogisticRegression', 'RandomForestClassifier',
+                                              'HistGradientBoostingClassifier']},
+            accuracy, fscore)
 
 
 # ----
@@ -591,7 +673,7 @@ vs.evaluate(results, accuracy, fscore)
 # Import 'GridSearchCV', 'make_scorer', and any other necessary libraries
 from sklearn.metrics import accuracy_score, fbeta_score, make_scorer
 from sklearn.linear_model import LogisticRegression, LogisticRegressionCV
-from sklearn.grid_search import GridSearchCV
+from search import SuccessiveHalvingSearch
 
 # Initialize the classifier
 
@@ -604,20 +686,23 @@ parameters = [{'C': [0.01, 0.1, 1, 10],"solver" : ['newton-cg','liblinear']}]
 scorer = make_scorer(fbeta_score, beta=.5)
 
 
-# Perform grid search on the classifier using 'scorer' as the scoring method
-grid_obj =  GridSearchCV(LogisticRegression(penalty='l2', random_state=0),parameters ,scoring=scorer)
+# Perform a successive-halving search on the classifier using 'scorer' as the scoring method,
+# cross-validating on the split's folds of the training rows
+grid_obj = SuccessiveHalvingSearch(LogisticRegression(penalty='l2', random_state=0), parameters, scoring=scorer,
+                                   folds=split.folds)
 
 
 # Fit the grid search object to the training data and find the optimal parameters
-grid_fit = grid_obj.fit(X_train, y_train)
+with profiling.stage('hyperparameter_search'):
+    grid_fit = grid_obj.fit(X, y)
 
 
 # Get the estimator
 best_clf = grid_fit.best_estimator_
 
 # Make predictions using the unoptimized and model
-predictions = (clf.fit(X_train, y_train)).predict(X_test)
-best_predictions = best_clf.predict(X_test)
+predictions = (clf.fit(X[split.train], y[split.train])).predict(X[split.test])
+best_predictions = best_clf.predict(X[split.test])
 
 # Report the before-and-afterscores
 print ("Unoptimized model\n------")
@@ -627,6 +712,29 @@ print ("\nOptimized Model\n------")
 print ("Final accuracy score on the testing data: {:.4f}".format(accuracy_score(y_test, best_predictions)))
 print ("Final F-score on the testing data: {:.4f}".format(fbeta_score(y_test, best_predictions, beta = 0.5)))
 
+# Finer model selection: a warm-started 100-point C path, scored with the same F-0.5 scorer
+import search
+path_clf = search.logistic_path_search(X, y, scorer, Cs=np.logspace(-3, 3, 100), cv=split.folds)
+print ("F-score of the C path's best model on the testing data: {:.4f}".format(
+    metrics.binary_scores(y_test, path_clf.predict(X[split.test]))['f0.5']))
+
+# Save the fitted preprocessing, the tuned model and its threshold as one artifact for scoring new records
+import metrics
+import pipeline
+donor_pipeline = pipeline.DonorPipeline.from_fitted(scaler, encoded, best_clf)
+
+# Pick the F-0.5-optimal decision threshold from one sorted pass over out-of-fold probabilities
+# (the model refit on each CV fold of the training set, scoring the fold it didn't see)
+donor_pipeline.tune_threshold(features_raw, income, beta=.5, folds=split.folds)
+threshold_predictions = donor_pipeline.predict(features_raw.iloc[split.test])
+print ("\nOptimized Model at threshold {:.3f}\n------".format(donor_pipeline.threshold))
+print ("F-score on the testing data: {:.4f}".format(metrics.binary_scores(y_test, threshold_predictions)['f0.5']))
+
+# A sample of the training records travels with it, so `python refresh.py donor_pipeline.joblib <new month>.csv`
+# can update it with new records only
+donor_pipeline.keep_history(features_raw.iloc[split.train], y[split.train], size=20000)
+donor_pipeline.save("donor_pipeline.joblib")
+
 
 # ### Question 5 - Final Model Evaluation
 # 
@@ -692,13 +800,28 @@ print ("Final F-score on the testing data: {:.4f}".format(fbeta_score(y_test, be
 from sklearn.ensemble import AdaBoostClassifier
 
 # Train the supervised model on the training set
-model = AdaBoostClassifier(n_estimators=100).fit(X_train, y_train)
+model = model_cache.fit(AdaBoostClassifier(n_estimators=100), X[split.train], y[split.train])
 
 # Extract the feature importances
 importances = model.feature_importances_
 
+# Flattened copy of the 100 boosted trees for low-latency scoring of single records and small batches
+import forest
+compiled_model = forest.compile_ensemble(model)
+X_check = X[split.test[:1000]].toarray()
+assert (compiled_model.predict(X_check) == model.predict(X_check)).all()
+
 # Plot
-vs.feature_plot(importances, X_train, y_train)
+# feature_plot only reads the column names off its frame argument
+vs.feature_plot(importances, pd.DataFrame(columns = ds.columns), y[split.train])
+
+# Importances of the histogram-based booster over the 13 raw columns (categoricals undivided):
+# the drop in test F-0.5 when a column is shuffled
+from sklearn.inspection import permutation_importance
+hist_model = model_cache.fit(training.hist_boosting(binner, random_state = 0), Xb[split.train], y[split.train])
+hist_importances = permutation_importance(hist_model, Xb[split.test], y_test, scoring=scorer, n_repeats=5,
+                                          max_samples=min(len(split.test), 20000), random_state=0).importances_mean
+vs.feature_plot(hist_importances, features_binned, y[split.train])
 
 
 # ### Question 7 - Extracting Feature Importance
@@ -722,16 +845,18 @@ vs.feature_plot(importances, X_train, y_train)
 
 # Import functionality for cloning a model
 from sklearn.base import clone
+from pipeline import FeatureSelector
 
-# Reduce the feature space
-X_train_reduced = X_train[X_train.columns.values[(np.argsort(importances)[::-1])[:5]]]
-X_test_reduced = X_test[X_test.columns.values[(np.argsort(importances)[::-1])[:5]]]
+# Reduce the feature space, keeping the five most important columns
+selector = FeatureSelector(k=5).fit(importances)
+# (only the kept columns are read, then the training and testing rows are taken from those)
+X_reduced = selector.transform(X)
 
 # Train on the "best" model found from grid search earlier
-clf = (clone(best_clf)).fit(X_train_reduced, y_train)
+clf = (clone(best_clf)).fit(X_reduced[split.train], y[split.train])
 
 # Make new predictions
-reduced_predictions = clf.predict(X_test_reduced)
+reduced_predictions = clf.predict(X_reduced[split.test])
 
 # Report scores from the final model using both versions of data
 print ("Final Model trained on full data\n------")
@@ -741,6 +866,17 @@ print ("\nFinal Model trained on reduced data\n------")
 print ("Accuracy on testing data: {:.4f}".format(accuracy_score(y_test, reduced_predictions)))
 print ("F-score on testing data: {:.4f}".format(fbeta_score(y_test, reduced_predictions, beta =.5)))
 
+# Train/predict latency against the number of features kept, next to F-0.5
+import benchmark
+if run_benchmarks:
+    feature_timings = benchmark.feature_count_benchmark(best_clf, importances, *ds.take(split.train),
+                                                        *ds.take(split.test), counts=(5, 10, 20, None))
+
+# Where the time went, per pipeline stage (fits and predictions of the parallel sweeps included)
+if profiling.PROFILER.enabled:
+    print(profiling.PROFILER.report())
+    profiling.PROFILER.chrome_trace("donors_trace.json")
+
 
 # ### Question 8 - Effects of Feature Selection
 # 
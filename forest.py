@@ -0,0 +1,136 @@
+###########################################
+# Compiled inference for fitted tree ensembles
+###########################################
+
+import numpy as np
+from sklearn.utils.extmath import softmax
+
+
+class CompiledEnsemble(object):
+    '''
+    A fitted RandomForestClassifier / ExtraTreesClassifier or AdaBoostClassifier (SAMME, tree
+    base estimators) flattened into contiguous numpy arrays: feature, threshold, left, right and
+    value of every node of every tree, with the trees' nodes laid end to end.
+
+    Batches are scored by walking all trees at once: every step moves the current node of each
+    (record, tree) pair one level down with a handful of vectorized array operations, so a single
+    record costs about 'max_depth' numpy calls instead of one Python-level predict per tree.
+    Predictions and probabilities are computed exactly as sklearn does and match the original
+    model. This is the path for single records and small batches; on large batches with deep
+    trees the original model's compiled predict is as fast or faster.
+    '''
+
+    def __init__(self, model, block_rows=4096):
+        self.block_rows = block_rows
+        self.classes_ = model.classes_
+        self.n_features_in_ = model.n_features_in_
+        self.kind = 'adaboost' if hasattr(model, 'estimator_weights_') else 'forest'
+        if self.kind == 'adaboost':
+            self.estimator_weights_ = np.asarray(model.estimator_weights_, dtype=np.float64)
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            nodes = np.arange(tree.node_count)
+
+            # Leaves point to themselves and always "go left", so walking past them is a no-op
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, nodes, tree.children_right) + offset)
+
+            value = tree.value[:, 0, :len(self.classes_)].astype(np.float64)
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(value / normalizer)
+
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        self.feature = np.ascontiguousarray(np.concatenate(features), dtype=np.intp)
+        self.threshold = np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64)
+        self.left = np.ascontiguousarray(np.concatenate(lefts), dtype=np.intp)
+        self.right = np.ascontiguousarray(np.concatenate(rights), dtype=np.intp)
+        self.value = np.ascontiguousarray(np.concatenate(values))
+        self.leaf_class = np.argmax(self.value, axis=1)
+        # Children side by side, so one lookup moves a node right (column 0) or left (column 1)
+        self.children = np.ascontiguousarray(np.column_stack([self.right, self.left]))
+        self.is_leaf = self.left == np.arange(len(self.left))
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.max_depth = max_depth
+
+    def apply(self, X):
+        '''
+        Global index of the leaf each record reaches in each tree, shape (n_records, n_trees).
+        '''
+
+        # sklearn's trees compare float32 features against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        flat = X.ravel()
+        node = np.repeat(self.roots[np.newaxis, :], len(X), axis=0)
+        row_offset = (np.arange(len(X)) * X.shape[1])[:, np.newaxis]
+        for depth in range(self.max_depth):
+            go_left = flat[row_offset + self.feature[node]] <= self.threshold[node]
+            node = self.children[node, go_left.view(np.uint8)]
+            # Most trees are much shallower than the deepest one
+            if depth % 4 == 3 and self.is_leaf[node].all():
+                break
+        return node
+
+    def _score_block(self, X):
+        leaves = self.apply(X)
+        if self.kind == 'forest':
+            # Reducing over the (non-contiguous) tree axis adds the trees one by one in order,
+            # like RandomForestClassifier's accumulation
+            proba = self.value[leaves].sum(axis=1)
+            proba /= leaves.shape[1]
+            return proba
+
+        # SAMME decision function, accumulated in the same order as AdaBoostClassifier
+        n_classes = len(self.classes_)
+        class_index = np.arange(n_classes)
+        pred = sum(np.where(self.leaf_class[leaves[:, t]][:, np.newaxis] == class_index,
+                            w, -1 / (n_classes - 1) * w)
+                   for t, w in zip(range(leaves.shape[1]), self.estimator_weights_))
+        pred /= self.estimator_weights_.sum()
+        if n_classes == 2:
+            pred[:, 0] *= -1
+            return pred.sum(axis=1)
+        return pred
+
+    def _score(self, X):
+        X = np.asarray(X)
+        if len(X) <= self.block_rows:
+            return self._score_block(X)
+        return np.concatenate([self._score_block(X[start:start + self.block_rows])
+                               for start in range(0, len(X), self.block_rows)])
+
+    def decision_function(self, X):
+        if self.kind != 'adaboost':
+            raise AttributeError("decision_function is only available for AdaBoost")
+        return self._score(X)
+
+    def predict_proba(self, X):
+        scores = self._score(X)
+        if self.kind == 'forest':
+            return scores
+        n_classes = len(self.classes_)
+        if n_classes == 2:
+            scores = np.vstack([-scores, scores]).T / 2
+        else:
+            scores = scores / (n_classes - 1)
+        return softmax(scores, copy=False)
+
+    def predict(self, X):
+        scores = self._score(X)
+        if self.kind == 'adaboost' and len(self.classes_) == 2:
+            return self.classes_.take(scores > 0, axis=0)
+        return self.classes_.take(np.argmax(scores, axis=1), axis=0)
+
+
+def compile_ensemble(model, block_rows=4096):
+    return CompiledEnsemble(model, block_rows)
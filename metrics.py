@@ -0,0 +1,106 @@
+###########################################
+# Vectorized binary classification metrics
+###########################################
+
+import numpy as np
+
+import profiling
+
+
+def confusion_counts(y_true, y_pred):
+    '''
+    Counts tn, fp, fn, tp in a single bincount over 2*y_true + y_pred.
+
+    'y_pred' is either one vector of 0/1 predictions or a 2-D stack with one row per model (or
+    threshold); the returned array has shape (4,) or (n_models, 4) respectively, with columns
+    tn, fp, fn, tp.
+    '''
+
+    y_true = np.asarray(y_true, dtype=np.int64)
+    y_pred = np.asarray(y_pred, dtype=np.int64)
+    if y_pred.ndim == 1:
+        return np.bincount(2 * y_true + y_pred, minlength=4)
+
+    n_models = y_pred.shape[0]
+    cells = 2 * y_true + y_pred + 4 * np.arange(n_models)[:, None]
+    return np.bincount(cells.ravel(), minlength=4 * n_models).reshape(n_models, 4)
+
+
+def scores_from_counts(counts, betas=(0.5,)):
+    '''
+    Accuracy, precision, recall and F-beta for every beta in 'betas' from confusion counts.
+
+    Works element-wise on the output of confusion_counts, so a stack of models is scored at once.
+    Undefined ratios (no predicted or no actual positives) are reported as 0, like sklearn does.
+    '''
+
+    counts = np.asarray(counts, dtype=np.float64)
+    tn, fp, fn, tp = (counts[..., i] for i in range(4))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = {
+            'accuracy': (tp + tn) / counts.sum(axis=-1),
+            'precision': np.nan_to_num(tp / (tp + fp)),
+            'recall': np.nan_to_num(tp / (tp + fn)),
+        }
+        for beta in betas:
+            b2 = beta ** 2
+            scores['f{}'.format(beta)] = np.nan_to_num((1 + b2) * tp / ((1 + b2) * tp + b2 * fn + fp))
+    return scores
+
+
+def binary_scores(y_true, y_pred, betas=(0.5,)):
+    '''
+    One pass over the labels for all the metrics the notebook reports, e.g.
+    binary_scores(y_test, predictions)['f0.5'].
+    '''
+
+    with profiling.stage('metrics'):
+        return scores_from_counts(confusion_counts(y_true, y_pred), betas)
+
+
+def threshold_sweep(y_true, scores, beta=0.5):
+    '''
+    Precision, recall and F-beta at every distinct decision threshold in one sorted pass.
+
+    Records are predicted positive when their score is >= the threshold. Scores are sorted once
+    and the true/false positive counts of all thresholds come from cumulative sums, so the cost
+    is O(n log n) however many thresholds there are.
+
+    Returns a dict of arrays 'threshold', 'precision', 'recall' and 'fbeta', thresholds descending.
+    '''
+
+    with profiling.stage('threshold_sweep'):
+        return _threshold_sweep(y_true, scores, beta)
+
+
+def _threshold_sweep(y_true, scores, beta):
+    y_true = np.asarray(y_true, dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.float64)
+
+    order = np.argsort(-scores, kind='mergesort')
+    scores = scores[order]
+    y_sorted = y_true[order]
+
+    # Last position of every run of equal scores: everything up to it is predicted positive
+    ends = np.r_[np.flatnonzero(np.diff(scores)), len(scores) - 1]
+    tp = np.cumsum(y_sorted)[ends].astype(np.float64)
+    fp = (ends + 1) - tp
+    fn = y_sorted.sum() - tp
+
+    b2 = beta ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.nan_to_num(tp / (tp + fp))
+        recall = np.nan_to_num(tp / (tp + fn))
+        fbeta = np.nan_to_num((1 + b2) * tp / ((1 + b2) * tp + b2 * fn + fp))
+    return {'threshold': scores[ends], 'precision': precision, 'recall': recall, 'fbeta': fbeta}
+
+
+def best_threshold(y_true, scores, beta=0.5):
+    '''
+    The decision threshold with the highest F-beta, and that F-beta.
+    '''
+
+    sweep = threshold_sweep(y_true, scores, beta)
+    best = np.argmax(sweep['fbeta'])
+    return float(sweep['threshold'][best]), float(sweep['fbeta'][best])
@@ -0,0 +1,130 @@
+###########################################
+# Content-addressed cache of fitted models
+###########################################
+
+import hashlib
+import os
+from time import perf_counter
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from scipy import sparse
+
+
+def data_digest(data, digest=None):
+    '''
+    Hash of the contents of a training slice: a DataFrame/Series, a numpy array or a sparse matrix.
+    '''
+
+    if digest is None:
+        digest = hashlib.blake2b(digest_size=16)
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        digest.update(repr(list(data.columns) if hasattr(data, 'columns') else data.name).encode())
+        digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    elif sparse.issparse(data):
+        data = data.tocsr()
+        for part in (data.data, data.indices, data.indptr):
+            digest.update(np.ascontiguousarray(part).tobytes())
+        digest.update(repr(data.shape).encode())
+    else:
+        data = np.ascontiguousarray(data)
+        digest.update(repr((data.dtype.str, data.shape)).encode())
+        digest.update(data.tobytes())
+    return digest
+
+
+class ModelCache(object):
+    '''
+    On-disk cache of fitted estimators, so reruns of the notebook don't retrain.
+
+    Entries are keyed by the hash of the training slice, the estimator's class and get_params(),
+    and the scikit-learn version. When the cache grows past 'max_bytes' the least recently used
+    entries are evicted. 'stats' counts hits, misses and the training seconds saved by hits, and
+    'last_fit_seconds' holds the original training time of the model fit returned last.
+    '''
+
+    def __init__(self, directory=".model_cache", max_bytes=2 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.last_fit_seconds = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {'hits': 0, 'misses': 0, 'seconds_saved': 0.0}
+
+    def merge_stats(self, stats):
+        for key, value in stats.items():
+            self.stats[key] += value
+
+    def key(self, estimator, X, y):
+        digest = data_digest(X)
+        data_digest(y, digest)
+        params = sorted((name, repr(value)) for name, value in estimator.get_params().items())
+        digest.update(repr((estimator.__class__.__module__, estimator.__class__.__name__,
+                            params, sklearn.__version__)).encode())
+        return digest.hexdigest()
+
+    def fit(self, estimator, X, y):
+        '''
+        Returns 'estimator' fitted on X, y, loading it from the cache when it was fitted before.
+        '''
+
+        path = os.path.join(self.directory, self.key(estimator, X, y) + '.joblib')
+        if os.path.exists(path):
+            entry = joblib.load(path)
+            os.utime(path)  # mark as recently used
+            self.stats['hits'] += 1
+            self.stats['seconds_saved'] += entry['seconds']
+            self.last_fit_seconds = entry['seconds']
+            return entry['model']
+
+        start = perf_counter()
+        model = estimator.fit(X, y)
+        seconds = perf_counter() - start
+        self.stats['misses'] += 1
+        self.last_fit_seconds = seconds
+
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        joblib.dump({'model': model, 'seconds': seconds}, tmp_path)
+        os.replace(tmp_path, path)
+        self.evict()
+        return model
+
+    def entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.joblib'):
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                except OSError:  # evicted by another process meanwhile
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+        return sorted(entries)
+
+    def evict(self):
+        '''
+        Removes the least recently used entries until the cache fits in 'max_bytes'.
+        '''
+
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+
+    def report(self):
+        entries = self.entries()
+        return ("Model cache: {} hits, {} misses, {:.2f}s of training saved, "
+                "{} entries ({:.1f} MB)").format(
+                    self.stats['hits'], self.stats['misses'], self.stats['seconds_saved'],
+                    len(entries), sum(size for _, size, _ in entries) / 1024.0 ** 2)
@@ -0,0 +1,401 @@
+###########################################
+# Fitted preprocessing + model, saved as one artifact for scoring
+###########################################
+
+import copy
+import math
+import warnings
+from time import perf_counter
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.base import clone
+from sklearn.exceptions import ConvergenceWarning
+
+import census
+import metrics
+import profiling
+
+# Bump whenever the layout of DonorPipeline changes in a way old artifacts can't be read with
+ARTIFACT_VERSION = 1
+
+
+def _take(X, index):
+    return X.iloc[index] if hasattr(X, 'iloc') else X[index]
+
+
+class DonorPipeline(object):
+    '''
+    The whole fitted preprocessing (log transform, min-max scaling, one-hot vocabulary) together
+    with the tuned classifier.
+
+    Batches go through transform/predict_proba/predict as numpy arrays. Single records go through
+    predict_record_proba, which for linear models never touches pandas or numpy: it looks up the
+    record's dummy columns in a dict and sums the matching coefficients.
+
+    predict/predict_record call a record positive when its probability is >= 'threshold', which
+    metrics.best_threshold can tune for F-0.5 instead of the default 0.5.
+    '''
+
+    def __init__(self, data_min, data_max, vocab, model, threshold=0.5, selector=None):
+        self.data_min = dict(data_min)
+        self.data_max = dict(data_max)
+        self.vocab = {col: list(values) for col, values in vocab.items()}
+        self.model = model
+        self.threshold = threshold
+        self.selector = selector
+        self.history = None
+        self._build()
+
+    def _build(self):
+        self.columns = census.encoded_columns({'vocab': self.vocab})
+        self.index = {name: j for j, name in enumerate(self.columns)}
+
+        # The columns the model sees; with a selector, the others are never computed at all
+        kept = range(len(self.columns)) if self.selector is None else self.selector.indices_
+        self.output_columns = [self.columns[j] for j in kept]
+        position = {int(j): k for k, j in enumerate(kept)}
+
+        # (numerical column, position in the model's input)
+        self.numeric_out = [(col, position[j]) for j, col in enumerate(census.NUMERICAL)
+                            if j in position]
+
+        # (column, value) -> position of its dummy in the model's input
+        self.dummy_index = {}
+        for col in census.CATEGORICAL:
+            for value in self.vocab[col]:
+                j = self.index["{}_{}".format(col, value)]
+                if j in position:
+                    self.dummy_index[(col, value)] = position[j]
+        self.encoder = census.SparseEncoder(self.vocab)
+        # Position in the model's input of every encoded column, -1 for the ones not kept
+        self._out_position = np.full(len(self.columns) + 1, -1, dtype=np.int64)
+        self._out_position[list(position)] = list(position.values())
+
+        self.scale = {}
+        for col in census.NUMERICAL:
+            span = self.data_max[col] - self.data_min[col]
+            self.scale[col] = 1.0 / span if span > 0 else 1.0
+        # The same min/max in NUMERICAL order, for census.log_minmax
+        self._numeric_min = np.array([self.data_min[col] for col in census.NUMERICAL])
+        self._numeric_max = np.array([self.data_max[col] for col in census.NUMERICAL])
+
+        # Linear models get the pure-python scoring path
+        self._coef = None
+        if hasattr(self.model, 'coef_') and np.ndim(self.model.coef_) == 2 and len(self.model.coef_) == 1:
+            self._coef = [float(w) for w in self.model.coef_[0]]
+            self._intercept = float(np.ravel(self.model.intercept_)[0])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ('columns', 'index', 'output_columns', 'numeric_out', 'dummy_index',
+                    'encoder', '_out_position', 'scale', '_numeric_min', '_numeric_max', '_coef', '_intercept'):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        # Attributes added after the first artifacts were saved, with the values they implied
+        state.setdefault('threshold', 0.5)
+        state.setdefault('selector', None)
+        state.setdefault('history', None)
+        self.__dict__.update(state)
+        self._build()
+
+    @classmethod
+    def from_fitted(cls, scaler, encoded, model, numerical=census.NUMERICAL, selector=None):
+        '''
+        Builds the pipeline from the objects the notebook fits.
+
+        inputs:
+           - scaler: the MinMaxScaler fitted on features_log_transformed[numerical]
+           - encoded: the column names of features_final
+           - model: the fitted classifier, e.g. grid_fit.best_estimator_
+           - numerical: the column order the scaler was fitted with
+           - selector: optional fitted FeatureSelector the model was trained behind
+        '''
+
+        data_min = dict(zip(numerical, scaler.data_min_))
+        data_max = dict(zip(numerical, scaler.data_max_))
+        vocab = {col: [] for col in census.CATEGORICAL}
+        for name in encoded:
+            for col in census.CATEGORICAL:
+                if name.startswith(col + '_'):
+                    vocab[col].append(name[len(col) + 1:])
+        pipeline = cls(data_min, data_max, vocab, model, selector=selector)
+        if pipeline.columns != list(encoded):
+            raise ValueError("encoded columns are not in pd.get_dummies order")
+        return pipeline
+
+    @classmethod
+    def from_stats(cls, stats, model):
+        '''
+        Builds the pipeline from the statistics of census.fit_chunked.
+        '''
+
+        return cls(stats['min'], stats['max'], stats['vocab'], model)
+
+    def save(self, path):
+        joblib.dump({'version': ARTIFACT_VERSION,
+                     'sklearn_version': sklearn.__version__,
+                     'pipeline': self}, path)
+
+    def tune_threshold(self, features, y, beta=0.5, folds=None):
+        '''
+        Sets 'threshold' to the F-beta-optimal cutoff on (features, y) and returns that F-beta.
+
+        With 'folds' ((fit, validate) row positions into 'features', e.g. split.folds) the cutoff
+        is picked on out-of-fold probabilities: a clone of the model is refit on each fold's fit
+        rows and scores its validate rows, so the threshold is never chosen on probabilities of
+        rows the model was trained on. Without folds, pass rows the model has not seen.
+        '''
+
+        y = np.asarray(y)
+        if folds is None:
+            probabilities = self.predict_proba(features)
+        else:
+            X = self._model_input(self.transform(features))
+            validated, probabilities = [], []
+            for fit, validate in folds:
+                model = clone(self.model).fit(_take(X, fit), y[fit])
+                probabilities.append(model.predict_proba(_take(X, validate))[:, 1])
+                validated.append(validate)
+            probabilities = np.concatenate(probabilities)
+            y = y[np.concatenate(validated)]
+
+        self.threshold, fbeta = metrics.best_threshold(y, probabilities, beta)
+        return fbeta
+
+    @staticmethod
+    def load(path, mmap_mode='r'):
+        artifact = joblib.load(path, mmap_mode=mmap_mode)
+        if artifact.get('version') != ARTIFACT_VERSION:
+            raise ValueError("{} has artifact version {}, expected {}".format(
+                path, artifact.get('version'), ARTIFACT_VERSION))
+        return artifact['pipeline']
+
+    def keep_history(self, features, income, size=20000, random_state=0):
+        '''
+        Stores a uniform sample of at most 'size' of the training records (raw features and 0/1
+        labels) in the pipeline; refresh lets it stand in for the full history.
+        '''
+
+        rng = np.random.RandomState(random_state)
+        take = np.sort(rng.choice(len(features), min(size, len(features)), replace=False))
+        self.history = {'features': features.iloc[take].reset_index(drop=True),
+                        'income': np.asarray(income)[take],
+                        'n_rows': len(features),
+                        'random_state': random_state}
+        return self
+
+    def _merge_history(self, features, income):
+        # Reservoir update: every record seen so far ends up in the new sample with equal probability
+        history = self.history
+        rng = np.random.RandomState(history['random_state'] + history['n_rows'])
+        size = len(history['income'])
+        n_total = history['n_rows'] + len(features)
+        n_new = min(rng.binomial(size, len(features) / float(n_total)), len(features))
+        old = np.sort(rng.choice(size, size - n_new, replace=False))
+        new = np.sort(rng.choice(len(features), n_new, replace=False))
+        merged = pd.concat([history['features'].iloc[old].astype(object),
+                            features.iloc[new].astype(object)], ignore_index=True)
+        return {'features': merged,
+                'income': np.concatenate([history['income'][old], np.asarray(income)[new]]),
+                'n_rows': n_total,
+                'random_state': history['random_state']}
+
+    def refresh(self, features, income, holdout=0.2, max_iter=100):
+        '''
+        Updates the pipeline with newly arrived records, without reprocessing the full history.
+
+        The last 'holdout' fraction of the new records is kept back as a scoring window; the rest
+        extends the scaler's min/max and the category vocabulary (census.merge_stats). The model's
+        coefficients are first re-expressed for the new scaling and widened with zero weights for
+        any new dummy columns, which leaves every probability unchanged, and the LogisticRegression
+        is then warm-started from them.
+
+        The fit sees the new rows plus the history sample of keep_history, weighted up to the
+        number of records it stands for, so it approximates a refit on all the data while costing
+        time proportional to the new records (and the fixed sample size). The old coefficients
+        are only the starting point: the solver converges to the optimum of what it sees, so
+        without a history sample the refreshed model is a fit of the new rows alone.
+
+        liblinear ignores warm_start, so an L2 liblinear model is refreshed with lbfgs (which
+        does not penalize the intercept); other liblinear models are rejected.
+
+        Returns the refreshed pipeline (this one is left unchanged) and a report comparing the
+        old and refreshed pipelines on the window.
+
+        inputs:
+           - features: the new records' raw census features, oldest first
+           - income: their 0/1 income labels
+           - holdout: fraction of the newest records used as the scoring window
+           - max_iter: solver iterations of the warm-started fit
+        '''
+
+        params = self.model.get_params()
+        if self._coef is None or self.selector is not None or 'warm_start' not in params:
+            raise ValueError("refresh needs a binary LogisticRegression trained on all encoded columns")
+        l2 = params.get('penalty') == 'l2' or (params.get('penalty') == 'deprecated'
+                                               and params.get('l1_ratio') in (0, None))
+        if params.get('solver') == 'liblinear' and not l2:
+            raise ValueError("refresh can't warm-start a liblinear model with an L1 penalty")
+
+        start = perf_counter()
+        income = np.asarray(income)
+        n_window = int(math.ceil(len(features) * holdout))
+        n_fit = len(features) - n_window
+        if n_fit == 0:
+            raise ValueError("no new records left to train on after the holdout window")
+        fit_features, window_features = features.iloc[:n_fit], features.iloc[n_fit:]
+
+        stats = census.merge_stats({'min': self.data_min, 'max': self.data_max, 'vocab': self.vocab},
+                                   census.fit_frame(fit_features))
+        model = copy.deepcopy(self.model)
+        refreshed = DonorPipeline(stats['min'], stats['max'], stats['vocab'], model, self.threshold)
+
+        # w * (v - m0) * s0 == (w * s0 / s1) * (v - m1) * s1 + w * (m1 - m0) * s0
+        old_coef = dict(zip(self.columns, self._coef))
+        intercept = self._intercept
+        coef = np.zeros(len(refreshed.columns))
+        for j, name in enumerate(refreshed.columns):
+            if name in census.NUMERICAL:
+                coef[j] = old_coef[name] * self.scale[name] / refreshed.scale[name]
+                intercept += old_coef[name] * (refreshed.data_min[name] - self.data_min[name]) * self.scale[name]
+            else:
+                coef[j] = old_coef.get(name, 0.0)
+        model.coef_ = coef[np.newaxis, :]
+        model.intercept_ = np.array([intercept])
+        model.n_features_in_ = len(refreshed.columns)
+        if hasattr(model, 'feature_names_in_'):
+            model.feature_names_in_ = np.asarray(refreshed.columns, dtype=object)
+
+        X = refreshed.transform(fit_features)
+        y = income[:n_fit]
+        weight = np.ones(n_fit)
+        if self.history is not None:
+            sample = self.history
+            X = np.vstack([refreshed.transform(sample['features']), X])
+            y = np.concatenate([sample['income'], y])
+            weight = np.concatenate([np.full(len(sample['income']), sample['n_rows'] / float(len(sample['income']))),
+                                     weight])
+            refreshed.history = self._merge_history(fit_features, income[:n_fit])
+        X = refreshed._model_input(X)
+        model.set_params(warm_start=True, max_iter=max_iter)
+        if params.get('solver') == 'liblinear':
+            # liblinear would start from zero and throw the re-expressed coefficients away
+            model.set_params(solver='lbfgs', dual=False)
+        with warnings.catch_warnings():
+            # A small 'max_iter' stops the solver early on purpose
+            warnings.simplefilter('ignore', ConvergenceWarning)
+            model.fit(X, y, sample_weight=weight)
+        refreshed._build()
+
+        y_window = income[n_fit:]
+        before = metrics.binary_scores(y_window, self.predict(window_features))
+        after = metrics.binary_scores(y_window, refreshed.predict(window_features))
+        report = {'fit_rows': n_fit,
+                  'window_rows': n_window,
+                  'history_rows': 0 if self.history is None else len(self.history['income']),
+                  'new_columns': [name for name in refreshed.columns if name not in old_coef],
+                  'acc_before': before['accuracy'], 'f_before': before['f0.5'],
+                  'acc_after': after['accuracy'], 'f_after': after['f0.5'],
+                  'seconds': perf_counter() - start}
+        return refreshed, report
+
+    def transform(self, features):
+        '''
+        Encodes a frame of raw census features (as read from the csv) into a float32 matrix with
+        the training column layout, restricted to the selector's columns when there is one.
+        '''
+
+        # Fortran order, so the leading numeric columns are one block census.log_minmax can write into
+        X = np.zeros((len(features), len(self.output_columns)), dtype=np.float32, order='F')
+        n_numeric = len(census.NUMERICAL)
+        if [k for _, k in self.numeric_out] == list(range(n_numeric)):
+            census.log_minmax(features, self._numeric_min, self._numeric_max, out=X[:, :n_numeric])
+        elif self.numeric_out:
+            block = census.log_minmax(features, self._numeric_min, self._numeric_max)[0]
+            for col, k in self.numeric_out:
+                X[:, k] = block[:, census.NUMERICAL.index(col)]
+
+        # Unknown categories have code -1, which lands on the trailing -1 of _out_position
+        positions = self._out_position[self.encoder.codes(features)]
+        kept = positions >= 0
+        rows = np.repeat(np.arange(len(features)), len(census.CATEGORICAL)).reshape(positions.shape)
+        X[rows[kept], positions[kept]] = 1.0
+        return X
+
+    def _model_input(self, X):
+        if hasattr(self.model, 'feature_names_in_'):
+            # Fitted on the notebook's DataFrames, keep sklearn from warning about missing names
+            return pd.DataFrame(X, columns=self.output_columns, copy=False)
+        return X
+
+    def predict_proba(self, features):
+        with profiling.stage('transform'):
+            X = self._model_input(self.transform(features))
+        with profiling.stage('predict_proba'):
+            return self.model.predict_proba(X)[:, 1]
+
+    def predict(self, features):
+        return (self.predict_proba(features) >= self.threshold).astype(np.int8)
+
+    def predict_record_proba(self, record):
+        '''
+        Probability of making more than $50,000 for one record given as a dict of raw values.
+        '''
+
+        if self._coef is None:
+            return float(self.predict_proba(pd.DataFrame([record]))[0])
+
+        coef = self._coef
+        z = self._intercept
+        for col, k in self.numeric_out:
+            value = float(record[col])
+            if col in census.SKEWED:
+                value = math.log1p(value)
+            z += coef[k] * (value - self.data_min[col]) * self.scale[col]
+        for col in census.CATEGORICAL:
+            j = self.dummy_index.get((col, record[col]))
+            if j is not None:
+                z += coef[j]
+        if z >= 0:
+            return 1.0 / (1.0 + math.exp(-z))
+        ez = math.exp(z)
+        return ez / (1.0 + ez)
+
+    def predict_record(self, record):
+        return int(self.predict_record_proba(record) >= self.threshold)
+
+
+class FeatureSelector(object):
+    '''
+    Keeps the 'k' most important columns of the encoded matrix.
+
+    fit stores their indices once (sorted, so they read memory front to back); transform then
+    applies the same selection to any batch. On numpy input a contiguous selection comes back as
+    a zero-copy slice view; DonorPipeline goes further and only ever computes the kept columns.
+    '''
+
+    def __init__(self, k=5):
+        self.k = k
+
+    def fit(self, importances):
+        '''
+        inputs:
+           - importances: one score per encoded column, e.g. model.feature_importances_
+        '''
+
+        top = np.argsort(importances)[::-1][:self.k]
+        self.indices_ = np.sort(top)
+        return self
+
+    def transform(self, X):
+        indices = self.indices_
+        if hasattr(X, 'iloc'):
+            return X.iloc[:, indices]
+        if len(indices) and indices[-1] - indices[0] == len(indices) - 1:
+            return X[:, indices[0]:indices[-1] + 1]
+        return X[:, indices]
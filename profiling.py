@@ -0,0 +1,182 @@
+###########################################
+# Stage-level timing and profiling hooks
+###########################################
+
+import cProfile
+import collections
+import io
+import json
+import os
+import pstats
+import threading
+import tracemalloc
+from time import perf_counter
+
+
+class _NullStage(object):
+    # Shared do-nothing context manager handed out while profiling is disabled
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage(object):
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        profiler = self.profiler
+        if profiler.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self.mem_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        if profiler.cprofile:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = perf_counter()
+        profiler = self.profiler
+        record = {'name': self.name, 'start': self.start - profiler.origin, 'seconds': end - self.start,
+                  'tid': threading.get_ident()}
+        capture = None
+        if profiler.cprofile:
+            self.cprofile.disable()
+            capture = self.cprofile
+        if profiler.memory:
+            record['peak_bytes'] = tracemalloc.get_traced_memory()[1] - self.mem_start
+        profiler.add(record, capture)
+        return False
+
+
+class Profiler(object):
+    '''
+    Wraps pipeline stages with a timer and, optionally, a memory counter and a cProfile capture.
+
+        with profiling.stage('get_dummies'):
+            features_final = pd.get_dummies(features_log_minmax_transform)
+
+    While disabled, stage() returns one shared no-op context manager, so the hooks can stay in
+    production code. While enabled, memory stays bounded however long the process runs: per-stage
+    totals (and merged cProfile stats) are kept as running sums, and only the last 'max_records'
+    individual stage records are kept for the trace. report() prints the per-stage table;
+    chrome_trace() writes the kept records as a Chrome trace (chrome://tracing, Perfetto).
+
+    inputs:
+       - enabled: record anything at all
+       - memory: also record each stage's peak traced allocation (tracemalloc, slows things down)
+       - cprofile: also merge a cProfile capture of each stage into that stage's stats
+       - max_records: how many of the most recent stage records to keep for the trace
+    '''
+
+    def __init__(self, enabled=False, memory=False, cprofile=False, max_records=10000):
+        self.enabled = enabled
+        self.memory = memory
+        self.cprofile = cprofile
+        self.max_records = max_records
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.records = collections.deque(maxlen=self.max_records)
+        self.totals = {}
+        self.cprofile_stats = {}
+        self.origin = perf_counter()
+
+    def add(self, record, capture=None):
+        with self.lock:
+            self.records.append(record)
+            total = self.totals.setdefault(record['name'], {'calls': 0, 'seconds': 0.0, 'peak_bytes': None})
+            total['calls'] += 1
+            total['seconds'] += record['seconds']
+            if 'peak_bytes' in record:
+                total['peak_bytes'] = max(total['peak_bytes'] or 0, record['peak_bytes'])
+            if capture is not None:
+                if record['name'] in self.cprofile_stats:
+                    self.cprofile_stats[record['name']].add(capture)
+                else:
+                    self.cprofile_stats[record['name']] = pstats.Stats(capture)
+
+    def merge(self, totals):
+        '''
+        Adds per-stage totals recorded elsewhere, e.g. the summary() of a worker process, to this
+        profiler's. Seconds of stages that ran in parallel add up to more than the wall-clock time.
+        '''
+
+        with self.lock:
+            for name, other in totals.items():
+                total = self.totals.setdefault(name, {'calls': 0, 'seconds': 0.0, 'peak_bytes': None})
+                total['calls'] += other['calls']
+                total['seconds'] += other['seconds']
+                if other['peak_bytes'] is not None:
+                    total['peak_bytes'] = max(total['peak_bytes'] or 0, other['peak_bytes'])
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def summary(self):
+        '''
+        Per-stage totals since the last reset: calls, seconds and, with memory on, the largest peak.
+        '''
+
+        with self.lock:
+            return {name: dict(total) for name, total in self.totals.items()}
+
+    def report(self):
+        totals = self.summary()
+        overall = sum(total['seconds'] for total in totals.values()) or 1.0
+        lines = ["{:<28} {:>6} {:>10} {:>7} {:>12}".format('stage', 'calls', 'seconds', '%', 'peak MB')]
+        for name, total in sorted(totals.items(), key=lambda item: -item[1]['seconds']):
+            peak = '' if total['peak_bytes'] is None else "{:.1f}".format(total['peak_bytes'] / 1024.0 ** 2)
+            lines.append("{:<28} {:>6} {:>10.4f} {:>7.1f} {:>12}".format(
+                name, total['calls'], total['seconds'], 100 * total['seconds'] / overall, peak))
+        return "\n".join(lines)
+
+    def profile_stats(self, name, sort='cumulative', limit=20):
+        '''
+        The cProfile output of all captures of stage 'name', as text.
+        '''
+
+        with self.lock:
+            stats = self.cprofile_stats.get(name)
+            if stats is None:
+                return ''
+            out = io.StringIO()
+            stats.stream = out
+            stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def chrome_trace(self, path):
+        events = []
+        with self.lock:
+            records = list(self.records)
+        for record in records:
+            event = {'name': record['name'], 'ph': 'X', 'pid': os.getpid(), 'tid': record['tid'],
+                     'ts': record['start'] * 1e6, 'dur': record['seconds'] * 1e6}
+            if 'peak_bytes' in record:
+                event['args'] = {'peak_bytes': record['peak_bytes']}
+            events.append(event)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events}, f)
+
+
+# Process-wide profiler used by the library modules; DONORS_PROFILE=1 switches it on
+PROFILER = Profiler(enabled=os.environ.get('DONORS_PROFILE') == '1',
+                    memory=os.environ.get('DONORS_PROFILE_MEMORY') == '1')
+
+
+def stage(name):
+    return PROFILER.stage(name)
@@ -0,0 +1,54 @@
+###########################################
+# Monthly refresh of a saved DonorPipeline with newly arrived records
+#
+#   python refresh.py donor_pipeline.joblib new_records.csv --holdout 0.2 --max-iter 100
+###########################################
+
+import argparse
+
+import census
+from pipeline import DonorPipeline
+
+
+def refresh_file(model_path, records_path, output_path=None, holdout=0.2, max_iter=100, force=False):
+    '''
+    Refreshes the pipeline saved at 'model_path' with the labelled records of a census csv that
+    only holds the new rows (oldest first), see DonorPipeline.refresh.
+
+    The refreshed pipeline is written to 'output_path' (default: over 'model_path') unless its
+    F-0.5 on the held-out window is worse than the current one's and 'force' is not set.
+
+    Returns the refresh report, with 'saved' telling whether the artifact was written.
+    '''
+
+    pipeline = DonorPipeline.load(model_path, mmap_mode=None)
+    features_raw, income = census.split_target(census.load_census(records_path, cache_dir=None))
+    refreshed, report = pipeline.refresh(features_raw, income, holdout=holdout, max_iter=max_iter)
+
+    report['saved'] = force or report['f_after'] >= report['f_before']
+    if report['saved']:
+        refreshed.save(output_path or model_path)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update a saved donor pipeline with new records only.")
+    parser.add_argument('model', help="pipeline artifact written by DonorPipeline.save")
+    parser.add_argument('records', help="csv of the new labelled records, oldest first, same columns as census.csv")
+    parser.add_argument('--output', default=None, help="where to save the refreshed pipeline (default: over model)")
+    parser.add_argument('--holdout', type=float, default=0.2, help="fraction of the newest records to score on")
+    parser.add_argument('--max-iter', type=int, default=100, help="solver iterations of the warm-started fit")
+    parser.add_argument('--force', action='store_true', help="save even if F-0.5 on the window got worse")
+    args = parser.parse_args(argv)
+
+    report = refresh_file(args.model, args.records, args.output, holdout=args.holdout,
+                          max_iter=args.max_iter, force=args.force)
+    print("Refreshed on {} new records in {:.2f}s, {} new columns.".format(
+        report['fit_rows'], report['seconds'], len(report['new_columns'])))
+    print("Window of {} records: F-0.5 {:.4f} -> {:.4f}, accuracy {:.4f} -> {:.4f}.".format(
+        report['window_rows'], report['f_before'], report['f_after'], report['acc_before'], report['acc_after']))
+    print("Saved." if report['saved'] else "Not saved: the refreshed pipeline scored worse on the window.")
+
+
+if __name__ == '__main__':
+    main()
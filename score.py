@@ -0,0 +1,148 @@
+###########################################
+# Batch scoring of prospect files with a saved DonorPipeline
+#
+#   python score.py donor_pipeline.joblib prospects.csv predictions.csv --jobs 32
+###########################################
+
+import argparse
+import io
+import os
+import shutil
+import tempfile
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+import census
+from pipeline import DonorPipeline
+
+
+def _write_scores(pipeline, features, out, id_column):
+    probabilities = pipeline.predict_proba(features)
+    scores = pd.DataFrame({'prediction': (probabilities >= pipeline.threshold).astype(np.int8),
+                           'probability': probabilities})
+    if id_column is not None:
+        scores.insert(0, id_column, features[id_column].to_numpy())
+    scores.to_csv(out, header=False, index=False)
+    return len(scores)
+
+
+def _csv_ranges(path, n_ranges):
+    # Byte ranges of roughly equal size after the header line; a line belongs to the range it starts in
+    with open(path, 'rb') as f:
+        header = f.readline()
+        first = f.tell()
+    size = os.path.getsize(path)
+    bounds = np.linspace(first, size, n_ranges + 1).astype(np.int64)
+    return header.decode().rstrip('\r\n').split(','), list(zip(bounds[:-1], bounds[1:])), first
+
+
+def _score_csv_range(model_path, path, names, start, end, first, out_path, chunksize, id_column):
+    pipeline = DonorPipeline.load(model_path)
+    dtype = {name: census.SCHEMA[name] for name in names if name in census.SCHEMA}
+    n_rows = 0
+    with open(path, 'rb') as f, open(out_path, 'w') as out:
+        if start > first:
+            # Skip the line that started in the previous range
+            f.seek(start - 1)
+            f.readline()
+        else:
+            f.seek(start)
+        lines = []
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            lines.append(line)
+            if len(lines) == chunksize:
+                chunk = pd.read_csv(io.BytesIO(b''.join(lines)), names=names, dtype=dtype)
+                n_rows += _write_scores(pipeline, chunk, out, id_column)
+                lines = []
+        if lines:
+            chunk = pd.read_csv(io.BytesIO(b''.join(lines)), names=names, dtype=dtype)
+            n_rows += _write_scores(pipeline, chunk, out, id_column)
+    return n_rows
+
+
+def _score_parquet_groups(model_path, path, row_groups, out_path, chunksize, id_column):
+    import pyarrow.parquet as pq
+
+    pipeline = DonorPipeline.load(model_path)
+    n_rows = 0
+    with open(out_path, 'w') as out:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, row_groups=row_groups):
+            n_rows += _write_scores(pipeline, batch.to_pandas(), out, id_column)
+    return n_rows
+
+
+def score_file(model_path, input_path, output_path, n_jobs=-1, chunksize=100000, id_column=None):
+    '''
+    Scores a large csv or Parquet file of prospects with the pipeline saved at 'model_path'.
+
+    The input is split into row ranges (byte ranges of the csv, row groups of the Parquet file)
+    that a process pool preprocesses and predicts independently, reading at most 'chunksize'
+    rows at a time, so memory per worker is bounded whatever the file size. Each worker writes
+    its own part and the parts are concatenated in order into 'output_path', a csv with the
+    'prediction' and 'probability' of every input row (preceded by 'id_column' if given).
+
+    Returns the number of rows scored and the rows/sec throughput.
+    '''
+
+    start_time = perf_counter()
+    n_workers = os.cpu_count() if n_jobs == -1 else n_jobs
+    tmp_dir = tempfile.mkdtemp(prefix='donor_scores_', dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        if input_path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+
+            n_groups = pq.ParquetFile(input_path).num_row_groups
+            groups = [list(g) for g in np.array_split(np.arange(n_groups), min(n_workers, n_groups)) if len(g)]
+            parts = [os.path.join(tmp_dir, "part-{:05d}.csv".format(i)) for i in range(len(groups))]
+            jobs = [delayed(_score_parquet_groups)(model_path, input_path, [int(g) for g in group],
+                                                   part, chunksize, id_column)
+                    for group, part in zip(groups, parts)]
+        else:
+            # More ranges than workers keeps all of them busy until the end
+            names, ranges, first = _csv_ranges(input_path, 4 * n_workers)
+            parts = [os.path.join(tmp_dir, "part-{:05d}.csv".format(i)) for i in range(len(ranges))]
+            jobs = [delayed(_score_csv_range)(model_path, input_path, names, int(start), int(end), first,
+                                              part, chunksize, id_column)
+                    for (start, end), part in zip(ranges, parts)]
+
+        counts = Parallel(n_jobs=n_jobs)(jobs)
+
+        with open(output_path, 'w') as out:
+            header = ['prediction', 'probability']
+            if id_column is not None:
+                header.insert(0, id_column)
+            out.write(','.join(header) + '\n')
+            for part in parts:
+                with open(part) as f:
+                    shutil.copyfileobj(f, out)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    n_rows = sum(counts)
+    seconds = perf_counter() - start_time
+    return n_rows, n_rows / seconds if seconds > 0 else float('inf')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a prospect file with a saved donor pipeline.")
+    parser.add_argument('model', help="pipeline artifact written by DonorPipeline.save")
+    parser.add_argument('input', help="prospects as .csv or .parquet, with the census feature columns")
+    parser.add_argument('output', help="csv to write the predictions and probabilities to")
+    parser.add_argument('--jobs', type=int, default=-1, help="worker processes, -1 for all cores")
+    parser.add_argument('--chunksize', type=int, default=100000, help="rows per worker read")
+    parser.add_argument('--id-column', default=None, help="input column to copy into the output")
+    args = parser.parse_args(argv)
+
+    n_rows, rows_per_sec = score_file(args.model, args.input, args.output, n_jobs=args.jobs,
+                                      chunksize=args.chunksize, id_column=args.id_column)
+    print("Scored {} rows at {:.0f} rows/sec.".format(n_rows, rows_per_sec))
+
+
+if __name__ == '__main__':
+    main()
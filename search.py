@@ -0,0 +1,311 @@
+###########################################
+# Hyperparameter search
+###########################################
+
+import math
+import os
+import shutil
+import tempfile
+from time import perf_counter
+
+import joblib
+import numpy as np
+from joblib import Parallel, delayed
+from scipy import sparse
+from sklearn.base import clone
+from sklearn.linear_model import LogisticRegressionCV
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+from sklearn.pipeline import Pipeline
+
+
+def _take(X, index):
+    # Row selection that works for DataFrames/Series as well as arrays and sparse matrices
+    if hasattr(X, 'iloc'):
+        return X.iloc[index]
+    return X[index]
+
+
+def _fit_and_score(estimator, params, X, y, train, test, scoring):
+    model = clone(estimator).set_params(**params)
+    model.fit(_take(X, train), _take(y, train))
+    return scoring(model, _take(X, test), _take(y, test))
+
+
+def _as_matrix(X):
+    # Plain arrays (or CSR) memory-map cleanly, DataFrames of mixed dtypes don't
+    if sparse.issparse(X):
+        return X.tocsr()
+    return np.asarray(X, dtype=np.float32) if hasattr(X, 'iloc') else X
+
+
+def _fit_and_score_prepared(model, params, X_fit, y_fit, X_validate, y_validate, scoring):
+    model = clone(model).set_params(**params)
+    model.fit(X_fit, y_fit)
+    return scoring(model, X_validate, y_validate)
+
+
+class SuccessiveHalvingSearch(object):
+    '''
+    Successive-halving replacement for GridSearchCV.
+
+    Every candidate of 'param_grid' is first cross-validated on a small random sample of the
+    training set; only the best 1/'factor' of them are promoted to the next round, which uses
+    'factor' times more samples, until a single candidate is left or the full training set is
+    reached. With min_resources='exhaust' (like sklearn's HalvingGridSearchCV) the first round's
+    sample size is derived so that the last round runs on the full training set, so the final
+    candidates are always compared on all the data. The winner is then refit on the full
+    training set. Candidate x fold fits of a round
+    run in parallel, and the wall-clock time of each round is kept in 'rounds_'.
+
+    With 'folds' (e.g. splits.stratified_split(...).folds) X and y are the shared base matrix:
+    only the rows of the folds take part, every round keeps each fold restricted to its sample
+    of those rows, and the winner is refit on their union. Rows are taken by the fits themselves,
+    so X can be the memory-mapped X of a dataset.Dataset.
+
+    The fitted object exposes best_params_, best_score_ and best_estimator_ like GridSearchCV.
+
+    inputs:
+       - estimator: the unfitted model to tune
+       - param_grid: dict (or list of dicts) of parameter values, as for GridSearchCV
+       - scoring: a scorer, e.g. make_scorer(fbeta_score, beta=.5)
+       - min_resources: number of samples in the first round, or 'exhaust'
+       - factor: how aggressively candidates are cut and samples grown per round
+       - folds: optional (fit, validate) row indices into X, used instead of 'cv' new folds
+    '''
+
+    def __init__(self, estimator, param_grid, scoring, min_resources='exhaust', factor=3, cv=3,
+                 folds=None, n_jobs=-1, random_state=0, verbose=True):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.scoring = scoring
+        self.min_resources = min_resources
+        self.factor = factor
+        self.cv = cv
+        self.folds = folds
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.verbose = verbose
+
+    def _min_resources(self, n_candidates, n_samples):
+        if self.min_resources != 'exhaust':
+            return self.min_resources
+        n_rounds = 1
+        while n_candidates > self.factor:
+            n_candidates = int(math.ceil(n_candidates / float(self.factor)))
+            n_rounds += 1
+        # Still enough samples for every class in every fold of the first round
+        n_folds = self.cv if self.folds is None else len(self.folds)
+        return max(n_samples // self.factor ** (n_rounds - 1), 2 * n_folds * 2)
+
+    def _round_folds(self, sample, y_values):
+        if self.folds is None:
+            return [(sample[train], sample[test]) for train, test in
+                    StratifiedKFold(self.cv, shuffle=True, random_state=self.random_state)
+                    .split(sample, y_values[sample])]
+        # The given folds, restricted to this round's rows
+        return [(fit[np.isin(fit, sample)], validate[np.isin(validate, sample)])
+                for fit, validate in self.folds]
+
+    def fit(self, X, y):
+        y_values = np.asarray(y)
+        if self.folds is None:
+            rows = np.arange(X.shape[0])
+        else:
+            rows = np.unique(np.concatenate([np.r_[fit, validate] for fit, validate in self.folds]))
+        n_samples = len(rows)
+        order = rows[np.random.RandomState(self.random_state).permutation(n_samples)]
+
+        candidates = list(ParameterGrid(self.param_grid))
+        resources = min(self._min_resources(len(candidates), n_samples), n_samples)
+        self.rounds_ = []
+
+        with Parallel(n_jobs=self.n_jobs) as parallel:
+            while True:
+                start = perf_counter()
+                sample = order[:resources]
+                folds = self._round_folds(sample, y_values)
+                scores = parallel(
+                    delayed(_fit_and_score)(self.estimator, params, X, y, train, test, self.scoring)
+                    for params in candidates for train, test in folds)
+                scores = np.asarray(scores).reshape(len(candidates), len(folds)).mean(axis=1)
+
+                ranking = np.argsort(-scores, kind='stable')
+                self.rounds_.append({'n_candidates': len(candidates),
+                                     'n_samples': resources,
+                                     'best_score': float(scores[ranking[0]]),
+                                     'seconds': perf_counter() - start})
+                if self.verbose:
+                    print("Round {}: {} candidates on {} samples, best score {:.4f} ({:.2f}s)".format(
+                        len(self.rounds_), len(candidates), resources, scores[ranking[0]],
+                        self.rounds_[-1]['seconds']))
+
+                self.best_params_ = candidates[ranking[0]]
+                self.best_score_ = float(scores[ranking[0]])
+
+                keep = max(1, int(math.ceil(len(candidates) / float(self.factor))))
+                if keep == 1 or resources == n_samples:
+                    break
+                candidates = [candidates[i] for i in ranking[:keep]]
+                if max(1, int(math.ceil(keep / float(self.factor)))) == 1:
+                    # Last round: the remaining candidates are compared on everything
+                    resources = n_samples
+                else:
+                    resources = min(resources * self.factor, n_samples)
+
+        if self.folds is None:
+            self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(X, y)
+        else:
+            self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(
+                _take(X, rows), _take(y, rows))
+        return self
+
+
+class FoldCacheSearch(object):
+    '''
+    Exhaustive search over 'param_grid' (like GridSearchCV) that prepares every fold only once.
+
+    Each fold's training and validation matrices are sliced out of X once, passed through the
+    fold's preprocessing once, and dumped to a memory-mapped temp folder that all worker
+    processes read from; the candidate x fold fits then run in parallel on all cores without
+    re-slicing, re-validating or re-preprocessing anything per candidate.
+
+    If 'estimator' is a sklearn Pipeline whose tuned parameters all belong to its last step, the
+    earlier steps (e.g. a scaler) are the fold preprocessing and are fitted once per fold instead
+    of once per candidate and fold.
+
+    inputs:
+       - folds: (fit, validate) row indices into X, e.g. splits.stratified_split(...).folds
+       - scoring: a scorer, e.g. make_scorer(fbeta_score, beta=.5)
+    '''
+
+    def __init__(self, estimator, param_grid, scoring, folds, n_jobs=-1, temp_folder=None, verbose=True):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.scoring = scoring
+        self.folds = folds
+        self.n_jobs = n_jobs
+        self.temp_folder = temp_folder
+        self.verbose = verbose
+
+    def _split_estimator(self, candidates):
+        # (preprocessing, model, candidates with the model's own parameter names)
+        if not isinstance(self.estimator, Pipeline) or len(self.estimator.steps) < 2:
+            return None, self.estimator, candidates
+        last, model = self.estimator.steps[-1]
+        prefix = last + '__'
+        if not all(name.startswith(prefix) for params in candidates for name in params):
+            return None, self.estimator, candidates
+        stripped = [{name[len(prefix):]: value for name, value in params.items()} for params in candidates]
+        return Pipeline(self.estimator.steps[:-1]), model, stripped
+
+    def fit(self, X, y):
+        candidates = list(ParameterGrid(self.param_grid))
+        preprocessing, model, model_candidates = self._split_estimator(candidates)
+
+        start = perf_counter()
+        prepared = []
+        for fit_index, validate_index in self.folds:
+            X_fit, X_validate = _take(X, fit_index), _take(X, validate_index)
+            if preprocessing is not None:
+                fold_preprocessing = clone(preprocessing).fit(X_fit, _take(y, fit_index))
+                X_fit, X_validate = fold_preprocessing.transform(X_fit), fold_preprocessing.transform(X_validate)
+            prepared.append((_as_matrix(X_fit), np.asarray(_take(y, fit_index)),
+                             _as_matrix(X_validate), np.asarray(_take(y, validate_index))))
+        prepare_seconds = perf_counter() - start
+
+        folder = tempfile.mkdtemp(prefix='fold_cache_', dir=self.temp_folder)
+        try:
+            path = os.path.join(folder, 'folds.joblib')
+            joblib.dump(prepared, path)
+            del prepared
+            shared = joblib.load(path, mmap_mode='r')
+
+            start = perf_counter()
+            scores = Parallel(n_jobs=self.n_jobs)(
+                delayed(_fit_and_score_prepared)(model, params, X_fit, y_fit, X_validate, y_validate,
+                                                 self.scoring)
+                for params in model_candidates for X_fit, y_fit, X_validate, y_validate in shared)
+            search_seconds = perf_counter() - start
+            del shared
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+        scores = np.asarray(scores).reshape(len(candidates), len(self.folds))
+        self.cv_results_ = {'params': candidates,
+                            'mean_test_score': scores.mean(axis=1),
+                            'std_test_score': scores.std(axis=1),
+                            'split_test_scores': scores}
+        best = int(np.argmax(self.cv_results_['mean_test_score']))
+        self.best_index_ = best
+        self.best_params_ = candidates[best]
+        self.best_score_ = float(self.cv_results_['mean_test_score'][best])
+        if self.verbose:
+            print("{} candidates x {} folds: folds prepared in {:.2f}s, searched in {:.2f}s, best score {:.4f}".format(
+                len(candidates), len(self.folds), prepare_seconds, search_seconds, self.best_score_))
+
+        refit_index = np.unique(np.concatenate([np.r_[fit, validate] for fit, validate in self.folds]))
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(
+            _take(X, refit_index), _take(y, refit_index))
+        return self
+
+
+
+def logistic_path_search(X, y, scoring, Cs=np.logspace(-4, 4, 100), cv=3, solver='lbfgs',
+                         n_jobs=-1, verbose=True, **kwargs):
+    '''
+    Tunes LogisticRegression's C along a dense regularization path.
+
+    LogisticRegressionCV walks the Cs from strong to weak regularization and warm-starts every fit
+    from the previous coefficients, scoring each C on the held-out folds, so a 100-point path
+    costs a small multiple of one fit. 'solver' must be one that warm-starts (lbfgs, newton-cg,
+    sag, saga); liblinear refits every C from scratch.
+
+    Returns the fitted LogisticRegressionCV (refit at the best C on all of X, or with index pairs
+    on the union of the folds' rows); path_scores(model).mean(axis=0) is the mean fold score at
+    every C.
+
+    inputs:
+       - scoring: a scorer, e.g. make_scorer(fbeta_score, beta=.5)
+       - cv: number of stratified folds, or (fit, validate) index pairs into X, e.g.
+         splits.stratified_split(...).folds, in which case X is the shared base matrix and
+         only the folds' rows are taken out of it
+       - kwargs: passed on to LogisticRegressionCV, e.g. class_weight
+    '''
+
+    if not isinstance(cv, int):
+        folds = list(cv)
+        rows = np.unique(np.concatenate([np.r_[fit, validate] for fit, validate in folds]))
+        # Same folds, as positions into the taken rows
+        cv = [(np.searchsorted(rows, fit), np.searchsorted(rows, validate)) for fit, validate in folds]
+        X, y = _take(X, rows), _take(y, rows)
+
+    if 'use_legacy_attributes' in LogisticRegressionCV().get_params():
+        # sklearn 1.9 warns that the legacy dict attributes and l1_ratios=None go away; opt in to
+        # the new ones (an L2 path is l1_ratios=(0,))
+        kwargs.setdefault('use_legacy_attributes', False)
+        kwargs.setdefault('l1_ratios', (0.0,))
+    model = LogisticRegressionCV(Cs=np.sort(Cs), cv=cv, scoring=scoring, solver=solver,
+                                 n_jobs=n_jobs, refit=True, **kwargs)
+    start = perf_counter()
+    model.fit(X, y)
+    seconds = perf_counter() - start
+
+    if verbose:
+        scores = path_scores(model)
+        print("{} Cs x {} folds in {:.2f}s: best C {:.4g}, score {:.4f}".format(
+            len(model.Cs_), scores.shape[0], seconds, float(np.ravel(model.C_)[0]), scores.mean(axis=0).max()))
+    return model
+
+
+def path_scores(model):
+    '''
+    The fold scores of a fitted binary LogisticRegressionCV as an (n_folds, n_Cs) array, whether
+    it keeps sklearn's legacy attributes ({class: scores} dict) or the new ones (an
+    (n_folds, n_l1_ratios, n_Cs) array).
+    '''
+
+    scores = model.scores_
+    if isinstance(scores, dict):
+        scores = scores[model.classes_[1]]
+    scores = np.asarray(scores)
+    return scores.reshape(scores.shape[0], -1)
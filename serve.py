@@ -0,0 +1,230 @@
+###########################################
+# Local HTTP scoring service with request micro-batching
+#
+#   python serve.py donor_pipeline.joblib --port 8000 --max-batch 256 --max-wait-ms 5
+#
+#   POST /score    one record (JSON object) or several (JSON list) of raw census features
+#   GET  /metrics  latency histogram and throughput counters
+#   GET  /health
+###########################################
+
+import argparse
+import asyncio
+import bisect
+import json
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import pandas as pd
+
+from pipeline import DonorPipeline
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is everything slower
+LATENCY_BUCKETS_MS = [0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+
+class LatencyHistogram(object):
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.total += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket the q-quantile falls into
+        if not self.total:
+            return None
+        rank = q * self.total
+        seen = 0
+        for bound, count in zip(self.buckets + [float('inf')], self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def as_dict(self):
+        labels = ["le_{}".format(bound) for bound in self.buckets] + ['le_inf']
+        return {'buckets_ms': dict(zip(labels, self.counts)),
+                'p50_ms': self.quantile(0.5), 'p99_ms': self.quantile(0.99)}
+
+
+def _resolve(future, result, exc):
+    if future.done():
+        return
+    if exc is not None:
+        future.set_exception(exc)
+    else:
+        future.set_result(result)
+
+
+class MicroBatcher(object):
+    '''
+    Queues incoming records and scores them together: a batch is flushed into one vectorized
+    predict_proba call as soon as it holds 'max_batch' records or its oldest record has waited
+    'max_wait_ms', whichever comes first. The model runs on a worker thread, so the next batch
+    keeps filling while the current one is scored.
+    '''
+
+    def __init__(self, pipeline, max_batch=256, max_wait_ms=5.0):
+        self.pipeline = pipeline
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.batches = 0
+        self.records = 0
+
+    async def score(self, record):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((record, future))
+        return await future
+
+    def _predict(self, records):
+        probabilities = self.pipeline.predict_proba(pd.DataFrame(records))
+        return [(float(p), int(p >= self.pipeline.threshold)) for p in probabilities]
+
+    def _predict_each(self, batch):
+        loop = self.loop
+        for record, future in batch:
+            try:
+                output = self._predict([record])[0]
+            except Exception as exc:
+                loop.call_soon_threadsafe(_resolve, future, None, exc)
+            else:
+                loop.call_soon_threadsafe(_resolve, future, output, None)
+
+    async def run(self):
+        loop = self.loop = asyncio.get_running_loop()
+        while True:
+            record, future = await self.queue.get()
+            batch = [(record, future)]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batches += 1
+            self.records += len(batch)
+            try:
+                outputs = await loop.run_in_executor(self.executor, self._predict,
+                                                     [record for record, _ in batch])
+            except Exception:
+                # One malformed record fails the vectorized call; score one by one so only it errors
+                await loop.run_in_executor(self.executor, self._predict_each, batch)
+                continue
+            for (_, future), output in zip(batch, outputs):
+                if not future.done():
+                    future.set_result(output)
+
+
+class ScoringService(object):
+    '''
+    A minimal HTTP/1.1 server (asyncio streams, keep-alive) in front of a MicroBatcher.
+    '''
+
+    def __init__(self, pipeline, max_batch=256, max_wait_ms=5.0):
+        self.batcher = MicroBatcher(pipeline, max_batch, max_wait_ms)
+        self.latency = LatencyHistogram()
+        self.requests = 0
+        self.errors = 0
+        self.started = perf_counter()
+
+    def metrics(self):
+        uptime = perf_counter() - self.started
+        batches = self.batcher.batches
+        return {'requests': self.requests,
+                'errors': self.errors,
+                'records': self.batcher.records,
+                'batches': batches,
+                'mean_batch_size': self.batcher.records / float(batches) if batches else 0.0,
+                'uptime_seconds': uptime,
+                'requests_per_second': self.requests / uptime if uptime > 0 else 0.0,
+                'latency': self.latency.as_dict()}
+
+    async def handle_score(self, body):
+        payload = json.loads(body)
+        records = payload if isinstance(payload, list) else [payload]
+        outputs = await asyncio.gather(*[self.batcher.score(record) for record in records])
+        scores = [{'probability': p, 'prediction': label} for p, label in outputs]
+        return scores if isinstance(payload, list) else scores[0]
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                start = perf_counter()
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status = '200 OK'
+                if method == 'POST' and path == '/score':
+                    self.requests += 1
+                    try:
+                        response = await self.handle_score(body)
+                    except (ValueError, KeyError, TypeError) as exc:
+                        self.errors += 1
+                        status, response = '400 Bad Request', {'error': str(exc)}
+                    self.latency.add((perf_counter() - start) * 1000.0)
+                elif method == 'GET' and path == '/metrics':
+                    response = self.metrics()
+                elif method == 'GET' and path == '/health':
+                    response = {'status': 'ok'}
+                else:
+                    status, response = '404 Not Found', {'error': 'no route for {} {}'.format(method, path)}
+
+                data = json.dumps(response).encode()
+                writer.write("HTTP/1.1 {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n"
+                             .format(status, len(data)).encode() + data)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        batcher_task = asyncio.ensure_future(self.batcher.run())
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print("Scoring on http://{}:{}/score".format(host, port))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher_task.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a saved donor pipeline over HTTP on localhost.")
+    parser.add_argument('model', help="pipeline artifact written by DonorPipeline.save")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch', type=int, default=256, help="flush a batch at this many records")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help="or once its oldest record waited this long")
+    args = parser.parse_args(argv)
+
+    service = ScoringService(DonorPipeline.load(args.model), args.max_batch, args.max_wait_ms)
+    asyncio.run(service.serve(args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
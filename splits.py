@@ -0,0 +1,63 @@
+###########################################
+# Stratified, index-based train/test splitting
+###########################################
+
+import numpy as np
+from sklearn.model_selection import StratifiedKFold
+
+
+class Split(object):
+    '''
+    Row indices into the one shared feature matrix: 'train', 'test' and the CV 'folds' of the
+    training set, as (fit, validate) pairs of positions in the full matrix.
+
+    'train' is ordered so that each of its prefixes is itself stratified, which makes the nested
+    1%/10%/100% training subsets plain prefixes: subset(0.01) is contained in subset(0.1). The
+    prefixes are index arrays, so X[train[:sample_size]] copies just those rows, when and where
+    a fit takes them.
+    '''
+
+    def __init__(self, train, test, folds):
+        self.train = train
+        self.test = test
+        self.folds = folds
+
+    def sample_size(self, fraction):
+        return int(len(self.train) * fraction)
+
+    def subset(self, fraction):
+        return self.train[:self.sample_size(fraction)]
+
+
+def _stratified_order(index, y, rng):
+    # Spread every class evenly over the order: the k-th of n members of a class sits at
+    # (k + u) / n, u uniform in [0, 1), so any prefix holds each class in proportion
+    position = np.empty(len(index))
+    for label in np.unique(y):
+        members = np.flatnonzero(y == label)
+        rng.shuffle(members)
+        position[members] = (np.arange(len(members)) + rng.random_sample(len(members))) / len(members)
+    return index[np.argsort(position, kind='stable')]
+
+
+def stratified_split(y, test_size=0.2, n_folds=3, random_state=0):
+    '''
+    Splits the rows of a dataset with labels 'y' once into stratified train/test indices, plus
+    stratified CV folds of the training rows for the hyperparameter search.
+
+    Nothing is copied: consumers index the base matrix with the returned arrays.
+    '''
+
+    y = np.asarray(y)
+    rng = np.random.RandomState(random_state)
+    order = _stratified_order(np.arange(len(y)), y, rng)
+
+    n_test = int(np.ceil(len(y) * test_size))
+    # Every prefix of 'order' is stratified, and so is every suffix
+    test = np.sort(order[:n_test])
+    train = _stratified_order(order[n_test:], y[order[n_test:]], rng)
+
+    folds = []
+    for fit, validate in StratifiedKFold(n_folds, shuffle=True, random_state=random_state).split(train, y[train]):
+        folds.append((train[fit], train[validate]))
+    return Split(train, test, folds)
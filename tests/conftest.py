@@ -0,0 +1,70 @@
+###########################################
+# Shared fixtures: a small synthetic census, shaped like census.csv
+###########################################
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+# The modules live flat at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import census
+from pipeline import DonorPipeline
+
+CATEGORIES = {
+    'workclass': [' Private', ' Self-emp-not-inc', ' State-gov', ' Federal-gov', ' Local-gov'],
+    'education_level': [' Bachelors', ' HS-grad', ' Masters', ' Some-college', ' Doctorate'],
+    'marital-status': [' Never-married', ' Married-civ-spouse', ' Divorced'],
+    'occupation': [' Adm-clerical', ' Exec-managerial', ' Sales', ' Craft-repair'],
+    'relationship': [' Husband', ' Wife', ' Own-child', ' Not-in-family'],
+    'race': [' White', ' Black', ' Other'],
+    'sex': [' Male', ' Female'],
+    'native-country': [' United-States', ' Mexico', ' Canada'],
+}
+
+
+def make_census(n_rows, seed=0):
+    '''
+    A census-shaped frame (same columns, dtypes and leading-space categories as census.csv)
+    whose income depends on education, capital gain and marital status.
+    '''
+
+    rng = np.random.default_rng(seed)
+    data = {'age': rng.integers(17, 91, n_rows)}
+    for col in ['workclass', 'education_level']:
+        data[col] = rng.choice(CATEGORIES[col], n_rows)
+    data['education-num'] = rng.integers(1, 17, n_rows).astype(float)
+    for col in ['marital-status', 'occupation', 'relationship', 'race', 'sex']:
+        data[col] = rng.choice(CATEGORIES[col], n_rows)
+    data['capital-gain'] = np.where(rng.random(n_rows) < .1, rng.integers(1, 99999, n_rows), 0).astype(float)
+    data['capital-loss'] = np.where(rng.random(n_rows) < .05, rng.integers(1, 4356, n_rows), 0).astype(float)
+    data['hours-per-week'] = rng.integers(1, 99, n_rows).astype(float)
+    data['native-country'] = rng.choice(CATEGORIES['native-country'], n_rows)
+    score = (data['education-num'] / 16 + (data['capital-gain'] > 0)
+             + (data['marital-status'] == ' Married-civ-spouse') + rng.normal(0, .5, n_rows))
+    data['income'] = np.where(score > 1.3, '>50K', '<=50K')
+    return pd.DataFrame(data)
+
+
+def fitted_pipeline(features_raw, income, **params):
+    '''
+    A DonorPipeline around a LogisticRegression trained on the transform_chunk encoding of
+    'features_raw'; 'params' go to the LogisticRegression.
+    '''
+
+    stats = census.fit_frame(features_raw)
+    params.setdefault('max_iter', 1000)
+    model = LogisticRegression(**params).fit(census.transform_chunk(features_raw, stats).to_numpy(), income)
+    return DonorPipeline.from_stats(stats, model)
+
+
+@pytest.fixture
+def census_csv(tmp_path):
+    path = str(tmp_path / 'census.csv')
+    make_census(3000).to_csv(path, index=False)
+    return path
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+from sklearn.preprocessing import MinMaxScaler
+
+import census
+import dataset
+from conftest import make_census
+
+
+def test_sparse_encoder_matches_get_dummies(tmp_path):
+    features_raw, income = census.split_target(make_census(2000))
+    numeric, _, _ = census.log_minmax(features_raw)
+    features = pd.concat([pd.DataFrame(numeric, columns=census.NUMERICAL, index=features_raw.index),
+                          features_raw[census.CATEGORICAL]], axis=1)
+    dummies = pd.get_dummies(features)
+
+    encoder = census.SparseEncoder().fit(features_raw)
+    encoded = encoder.transform(features)
+
+    assert sparse.issparse(encoded) and encoded.format == 'csr'
+    assert encoded.dtype == np.float32
+    assert encoder.columns == list(dummies.columns)
+    np.testing.assert_array_equal(encoded.toarray(), dummies.to_numpy(dtype=np.float32))
+
+    # The CSR layout survives the round trip through the memory-mapped dataset
+    dataset.write_dataset(str(tmp_path / 'ds'), encoded, income, columns=encoder.columns)
+    ds = dataset.open_dataset(str(tmp_path / 'ds'))
+    assert ds.layout == 'csr' and ds.columns == encoder.columns
+    np.testing.assert_array_equal(ds.X[np.arange(0, 2000, 7)].toarray(), encoded[np.arange(0, 2000, 7)].toarray())
+
+
+def test_downcast_and_storage_report(tmp_path):
+    features_raw, income = census.split_target(make_census(2000))
+    compact, report = census.downcast(features_raw)
+
+    assert (compact.to_numpy() == features_raw.to_numpy()).all()
+    assert str(compact['workclass'].dtype) == 'category'
+    assert (report['bytes_saved'] >= 0).all() and report['bytes_saved'].sum() > 0
+
+    encoder = census.SparseEncoder().fit(features_raw)
+    dataset.write_dataset(str(tmp_path / 'ds'), encoder.transform(compact), income, columns=encoder.columns)
+    storage = dataset.open_dataset(str(tmp_path / 'ds')).storage_report()
+
+    # Every record has exactly one dummy per categorical column
+    dummies = storage.loc[encoder.columns[len(census.NUMERICAL):]]
+    assert dummies['bytes_stored'].sum() == 2000 * len(census.CATEGORICAL) * 8
+    assert dummies['bytes_stored'].sum() < dummies['bytes_dense'].sum()
+
+
+def _log1p_minmax_reference(features_raw, fit_on=None):
+    # The notebook's original path: np.log1p on the skewed columns, then MinMaxScaler, in float64
+    def log1p(features):
+        values = features[census.NUMERICAL].to_numpy(dtype=np.float64)
+        skewed = [census.NUMERICAL.index(col) for col in census.SKEWED]
+        values[:, skewed] = np.log1p(values[:, skewed])
+        return values
+
+    scaler = MinMaxScaler().fit(log1p(features_raw if fit_on is None else fit_on))
+    return scaler.transform(log1p(features_raw)), scaler
+
+
+def test_log_minmax_matches_log1p_and_minmaxscaler():
+    features_raw, _ = census.split_target(make_census(3000))
+    expected, scaler = _log1p_minmax_reference(features_raw)
+
+    # Fit path: the min/max are fitted on the block after the log
+    block, data_min, data_max = census.log_minmax(features_raw)
+    assert block.dtype == np.float32 and block.flags.f_contiguous
+    np.testing.assert_allclose(data_min, scaler.data_min_, rtol=1e-6)
+    np.testing.assert_allclose(data_max, scaler.data_max_, rtol=1e-6)
+    np.testing.assert_allclose(block, expected, rtol=0, atol=1e-6)
+
+    # Fused path on other records, with the fitted min/max, written into a given block
+    other, _ = census.split_target(make_census(2000, seed=1))
+    expected_other, _ = _log1p_minmax_reference(other, fit_on=features_raw)
+    out = np.empty((len(other), len(census.NUMERICAL)), dtype=np.float32, order='F')
+    block, _, _ = census.log_minmax(other, scaler.data_min_, scaler.data_max_, out=out)
+    assert block is out
+    np.testing.assert_allclose(block, expected_other, rtol=0, atol=1e-6)
+
+    # log_minmax_inplace on a numeric_block, both paths
+    block, _, _ = census.log_minmax_inplace(census.numeric_block(features_raw))
+    np.testing.assert_allclose(block, expected, rtol=0, atol=1e-6)
+    block, _, _ = census.log_minmax_inplace(census.numeric_block(other), scaler.data_min_, scaler.data_max_)
+    np.testing.assert_allclose(block, expected_other, rtol=0, atol=1e-6)
+
+    with pytest.raises(ValueError):
+        census.log_minmax(other, out=np.empty((len(other), len(census.NUMERICAL)), dtype=np.float32))
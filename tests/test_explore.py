@@ -0,0 +1,28 @@
+import numpy as np
+
+import explore
+
+
+def test_zero_dominated_quantiles_are_exact_at_zero():
+    rng = np.random.RandomState(0)
+    values = np.where(rng.random_sample(50000) < .9, 0, rng.randint(1, 99999, 50000)).astype(float)
+    hist = explore.StreamingHistogram(0, 100000, 25)
+    for chunk in np.array_split(values, 7):
+        hist.update(chunk)
+
+    assert hist.zeros == np.count_nonzero(values == 0)
+    assert hist.quantile(0.5) == (0.0, 0.0)
+    for q in (0.95, 0.99):
+        value, error = hist.quantile(q)
+        assert abs(value - np.quantile(values, q)) <= error
+
+
+def test_quantiles_of_a_range_around_zero():
+    rng = np.random.RandomState(1)
+    values = rng.normal(0, 1, 20000)
+    values[:2000] = 0
+    hist = explore.StreamingHistogram(-4, 4, 32).update(values)
+
+    for q in (0.05, 0.3, 0.5, 0.7, 0.95):
+        value, error = hist.quantile(q)
+        assert abs(value - np.quantile(values, q)) <= error
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from sklearn.datasets import load_iris
+from sklearn.ensemble import AdaBoostClassifier, ExtraTreesClassifier, RandomForestClassifier
+
+import census
+import forest
+from conftest import make_census
+
+
+def _encoded_census(n_rows, seed):
+    features_raw, income = census.split_target(make_census(n_rows, seed))
+    stats = census.fit_frame(features_raw)
+    return census.transform_chunk(features_raw, stats).to_numpy(), income.to_numpy()
+
+
+@pytest.mark.parametrize('model', [
+    RandomForestClassifier(n_estimators=20, random_state=0),
+    ExtraTreesClassifier(n_estimators=20, min_samples_leaf=3, random_state=0),
+    AdaBoostClassifier(n_estimators=30, random_state=0),
+])
+def test_compiled_ensemble_matches_sklearn_exactly(model):
+    X, y = _encoded_census(2000, seed=0)
+    X_new, _ = _encoded_census(1500, seed=1)
+    model.fit(X, y)
+    # A block size that doesn't divide the batch also covers the last, partial block
+    compiled = forest.compile_ensemble(model, block_rows=400)
+
+    np.testing.assert_array_equal(compiled.predict(X_new), model.predict(X_new))
+    np.testing.assert_array_equal(compiled.predict_proba(X_new), model.predict_proba(X_new))
+    np.testing.assert_array_equal(compiled.predict(X_new[:1]), model.predict(X_new[:1]))
+    if isinstance(model, AdaBoostClassifier):
+        np.testing.assert_array_equal(compiled.decision_function(X_new), model.decision_function(X_new))
+
+
+@pytest.mark.parametrize('model', [
+    RandomForestClassifier(n_estimators=10, random_state=0),
+    AdaBoostClassifier(n_estimators=20, random_state=0),
+])
+def test_compiled_ensemble_matches_sklearn_on_multiclass(model):
+    X, y = load_iris(return_X_y=True)
+    model.fit(X, y)
+    compiled = forest.compile_ensemble(model)
+
+    np.testing.assert_array_equal(compiled.predict(X), model.predict(X))
+    np.testing.assert_array_equal(compiled.predict_proba(X), model.predict_proba(X))
+    if isinstance(model, AdaBoostClassifier):
+        np.testing.assert_array_equal(compiled.decision_function(X), model.decision_function(X))
@@ -0,0 +1,48 @@
+import numpy as np
+from sklearn.metrics import confusion_matrix, fbeta_score, precision_score, recall_score
+
+import metrics
+
+
+def _labels_and_scores(n_rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    y_true = rng.integers(0, 2, n_rows)
+    # Rounded scores, so many records share a score and thresholds fall on ties
+    scores = np.round(np.clip(0.3 * y_true + rng.random(n_rows) * 0.7, 0, 1), 2)
+    return y_true, scores
+
+
+def test_threshold_sweep_matches_sklearn_at_every_threshold():
+    y_true, scores = _labels_and_scores()
+    sweep = metrics.threshold_sweep(y_true, scores, beta=0.5)
+
+    assert len(sweep['threshold']) == len(np.unique(scores))
+    assert (np.diff(sweep['threshold']) < 0).all()
+    for threshold, precision, recall, fbeta in zip(sweep['threshold'], sweep['precision'],
+                                                  sweep['recall'], sweep['fbeta']):
+        y_pred = (scores >= threshold).astype(int)
+        assert np.isclose(precision, precision_score(y_true, y_pred, zero_division=0))
+        assert np.isclose(recall, recall_score(y_true, y_pred, zero_division=0))
+        assert np.isclose(fbeta, fbeta_score(y_true, y_pred, beta=0.5, zero_division=0))
+
+
+def test_best_threshold_is_the_sklearn_optimum():
+    y_true, scores = _labels_and_scores(seed=1)
+    threshold, fbeta = metrics.best_threshold(y_true, scores, beta=0.5)
+
+    candidates = np.unique(scores)
+    reference = [fbeta_score(y_true, (scores >= t).astype(int), beta=0.5, zero_division=0) for t in candidates]
+    assert np.isclose(fbeta, max(reference))
+    assert np.isclose(fbeta_score(y_true, (scores >= threshold).astype(int), beta=0.5), fbeta)
+
+
+def test_confusion_counts_of_a_stack_of_predictions():
+    y_true, scores = _labels_and_scores(seed=2)
+    thresholds = np.array([0.0, 0.25, 0.5, 0.75, 1.01])
+    stack = (scores[np.newaxis, :] >= thresholds[:, np.newaxis]).astype(int)
+
+    counts = metrics.confusion_counts(y_true, stack)
+    assert counts.shape == (len(thresholds), 4)
+    for row, y_pred in zip(counts, stack):
+        np.testing.assert_array_equal(row, confusion_matrix(y_true, y_pred, labels=[0, 1]).ravel())
+        np.testing.assert_array_equal(row, metrics.confusion_counts(y_true, y_pred))
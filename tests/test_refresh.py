@@ -0,0 +1,65 @@
+from unittest import mock
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+import census
+from conftest import fitted_pipeline, make_census
+
+
+def _new_records(n_rows):
+    # A month with a category never seen before and values outside the old min/max
+    features_raw, income = census.split_target(make_census(n_rows, seed=1))
+    features_raw.loc[:9, 'workclass'] = ' Never-worked'
+    features_raw.loc[10:19, 'capital-gain'] = 250000.0
+    features_raw.loc[20:29, 'age'] = 16
+    features_raw.loc[30:39, 'hours-per-week'] = 120.0
+    return features_raw, income
+
+
+def test_refresh_reexpression_leaves_probabilities_unchanged():
+    pipeline = fitted_pipeline(*census.split_target(make_census(3000)))
+    features_raw, income = _new_records(500)
+
+    # Skip the warm-started fit, so the refreshed model holds the re-expressed coefficients only
+    with mock.patch.object(LogisticRegression, 'fit', lambda self, X, y, sample_weight=None: self):
+        refreshed, report = pipeline.refresh(features_raw, income, holdout=0.2)
+
+    assert report['new_columns'] == ['workclass_ Never-worked']
+    assert refreshed.data_max['capital-gain'] > pipeline.data_max['capital-gain']
+    assert refreshed.data_min['age'] < pipeline.data_min['age']
+    np.testing.assert_allclose(refreshed.predict_proba(features_raw), pipeline.predict_proba(features_raw),
+                               rtol=0, atol=1e-6)
+
+
+def test_refresh_fits_history_and_new_records():
+    features_raw, income = census.split_target(make_census(3000))
+    pipeline = fitted_pipeline(features_raw, income).keep_history(features_raw, income, size=1000)
+    new_features, new_income = _new_records(500)
+
+    refreshed, report = pipeline.refresh(new_features, new_income, holdout=0.2)
+
+    assert report['fit_rows'] == 400 and report['window_rows'] == 100
+    assert report['history_rows'] == 1000
+    assert refreshed.history['n_rows'] == 3400
+    assert len(refreshed.history['income']) == 1000
+    assert 'workclass_ Never-worked' in refreshed.columns
+    assert pipeline.history['n_rows'] == 3000
+
+
+def test_refresh_warm_starts_liblinear_models_with_lbfgs():
+    features_raw, income = census.split_target(make_census(3000))
+    pipeline = fitted_pipeline(features_raw, income, solver='liblinear')
+    new_features, new_income = _new_records(500)
+
+    # liblinear would ignore warm_start and refit the new rows from zero
+    with mock.patch.object(LogisticRegression, 'fit', lambda self, X, y, sample_weight=None: self):
+        refreshed, _ = pipeline.refresh(new_features, new_income, holdout=0.2)
+    assert refreshed.model.solver == 'lbfgs' and pipeline.model.solver == 'liblinear'
+    np.testing.assert_allclose(refreshed.predict_proba(new_features), pipeline.predict_proba(new_features),
+                               rtol=0, atol=1e-6)
+
+    l1 = fitted_pipeline(features_raw, income, solver='liblinear', l1_ratio=1.0)
+    with pytest.raises(ValueError):
+        l1.refresh(new_features, new_income)
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+import census
+import score
+from conftest import fitted_pipeline
+
+
+def test_csv_byte_ranges_score_every_row_once_in_order(tmp_path, census_csv):
+    # An id column makes the order checkable; rows of uneven length make ranges end mid-line
+    data = pd.read_csv(census_csv)
+    data.insert(0, 'record_id', np.arange(len(data)))
+    data.to_csv(census_csv, index=False)
+
+    features_raw, income = census.split_target(census.load_census(census_csv, cache_dir=None))
+    pipeline = fitted_pipeline(features_raw, income)
+    model_path = str(tmp_path / 'pipeline.joblib')
+    pipeline.save(model_path)
+
+    output_path = str(tmp_path / 'scores.csv')
+    n_rows, _ = score.score_file(model_path, census_csv, output_path, n_jobs=3, chunksize=97,
+                                 id_column='record_id')
+
+    scores = pd.read_csv(output_path)
+    assert n_rows == len(data)
+    assert scores['record_id'].tolist() == list(range(len(data)))
+    np.testing.assert_allclose(scores['probability'].to_numpy(), pipeline.predict_proba(features_raw), rtol=1e-6)
+    assert (scores['prediction'].to_numpy() == pipeline.predict(features_raw)).all()
+
+
+def test_csv_ranges_start_after_the_header(census_csv):
+    names, ranges, first = score._csv_ranges(census_csv, 8)
+    with open(census_csv, 'rb') as f:
+        header = f.readline()
+    assert names == header.decode().rstrip('\r\n').split(',')
+    assert ranges[0][0] == first == len(header)
+    assert all(end == start for (_, end), (start, _) in zip(ranges[:-1], ranges[1:]))
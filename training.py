@@ -0,0 +1,201 @@
+###########################################
+# Training sweeps over learners and sample sizes
+###########################################
+
+import copy
+import os
+from time import perf_counter
+
+import numpy as np
+from joblib import Parallel, delayed
+from scipy import sparse
+from sklearn.base import clone
+
+import census
+import metrics
+import profiling
+
+
+def take_rows(learner, X, rows):
+    '''
+    Rows 'rows' of X as 'learner' can take them: CSR rows stay sparse, and only for a learner
+    that rejects sparse input (GaussianNB) are just these rows densified.
+    '''
+
+    X_rows = X[rows]
+    if sparse.issparse(X_rows) and not learner.__sklearn_tags__().input_tags.sparse:
+        return X_rows.toarray()
+    return X_rows
+
+
+def _run_job(train_predict, learner, sample_size, X, y, train, test, cache, parent_pid, profile):
+    # A worker process has its own profiler: time the job's stages there and hand the totals back
+    in_worker = profile and os.getpid() != parent_pid
+    if in_worker:
+        profiling.PROFILER.enabled = True
+        profiling.PROFILER.reset()
+
+    if cache is None:
+        result, stats = train_predict(clone(learner), sample_size, X, y, train, test), None
+    else:
+        # Count this job's hits/misses on a private copy, the parent merges them afterwards
+        cache = copy.copy(cache)
+        cache.reset_stats()
+        result = train_predict(clone(learner), sample_size, X, y, train, test, cache=cache)
+        stats = cache.stats
+    return result, stats, profiling.PROFILER.summary() if in_worker else None
+
+
+def parallel_sweep(train_predict, learners, sample_sizes, X, y, train, test,
+                   n_jobs=-1, max_nbytes='1M', cache=None):
+    '''
+    Runs train_predict for every (learner, sample size) pair in a process pool and returns the
+    results in the results[clf_name][i] structure vs.evaluate expects.
+
+    X and y are the shared base matrix and labels and 'train'/'test' index arrays into them (e.g.
+    a splits.stratified_split); every job takes only the rows it fits and predicts on. X is
+    dumped once to a memory-mapped temp folder by joblib (anything larger than 'max_nbytes'),
+    or passed by reference if it already is a memory map (dataset.open_dataset), and opened
+    read-only by the workers, so it is not copied per job. The largest sample sizes are submitted
+    first, so with enough cores the sweep takes about as long as its slowest single fit.
+
+    inputs:
+       - train_predict: the train_predict function to run for every job
+       - learners: the (unfitted) learners to compare, each job trains its own clone
+       - sample_sizes: the training sample sizes, e.g. [samples_1, samples_10, samples_100]
+       - train, test: row indices into X and y; a sample is the first 'sample size' of 'train'
+       - n_jobs: number of worker processes, -1 for all cores
+       - cache: optional model_cache.ModelCache, passed on to train_predict as 'cache'
+
+    With profiling enabled, the stages the jobs time in the worker processes are merged into
+    profiling.PROFILER.
+    '''
+
+    jobs = [(learner, i, size) for learner in learners for i, size in enumerate(sample_sizes)]
+    jobs.sort(key=lambda job: -job[2])
+
+    outputs = Parallel(n_jobs=n_jobs, max_nbytes=max_nbytes, mmap_mode='r')(
+        delayed(_run_job)(train_predict, learner, size, X, y, train, test, cache,
+                          os.getpid(), profiling.PROFILER.enabled)
+        for learner, _, size in jobs)
+
+    results = {}
+    for learner in learners:
+        results[learner.__class__.__name__] = dict.fromkeys(range(len(sample_sizes)))
+    for (learner, i, _), (result, stats, profile) in zip(jobs, outputs):
+        results[learner.__class__.__name__][i] = result
+        if stats is not None:
+            cache.merge_stats(stats)
+        if profile is not None:
+            profiling.PROFILER.merge(profile)
+    return results
+
+
+def hist_boosting(binner, random_state=0, **params):
+    '''
+    A HistGradientBoostingClassifier for the uint8 frame of a fitted census.FeatureBinner: the
+    binned categorical columns are declared categorical, so their splits group categories
+    natively instead of going through one-hot columns.
+    '''
+
+    from sklearn.ensemble import HistGradientBoostingClassifier
+
+    return HistGradientBoostingClassifier(max_bins=binner.n_bins,
+                                          categorical_features=binner.categorical_mask,
+                                          random_state=random_state, **params)
+
+
+###########################################
+# Out-of-core incremental training
+###########################################
+
+def _partial_fit(learner, X, y, classes, trees_per_chunk):
+    if hasattr(learner, 'partial_fit'):
+        learner.partial_fit(X, y, classes=classes)
+        return
+    params = learner.get_params()
+    if 'warm_start' not in params or 'max_iter' not in params:
+        raise ValueError("{} supports neither partial_fit nor warm-started boosting".format(
+            learner.__class__.__name__))
+    # Boosted trees without partial_fit (HistGradientBoostingClassifier): every chunk adds
+    # 'trees_per_chunk' boosting rounds fitted on that chunk, on top of the previous ones
+    learner.set_params(warm_start=True, early_stopping=False,
+                       max_iter=getattr(learner, 'n_iter_', 0) + trees_per_chunk)
+    learner.fit(X, y)
+
+
+def train_predict_incremental(learner, parts, X_test, y_test, sample_size=None, classes=(0, 1),
+                              trees_per_chunk=20):
+    '''
+    Out-of-core counterpart of train_predict: streams the preprocessed part files written by
+    census.preprocess_chunked into 'learner' one chunk at a time, so the training set never has
+    to fit in memory. Reports the same fields as train_predict.
+
+    GaussianNB and SGDClassifier(loss='log_loss') (logistic regression) learn through
+    partial_fit; HistGradientBoostingClassifier grows 'trees_per_chunk' trees on every chunk.
+
+    inputs:
+       - learner: the learning algorithm to be trained and predicted on
+       - parts: the part files to train on, in order
+       - X_test: features testing set
+       - y_test: income testing set
+       - sample_size: stop after this many training rows, None for all of them
+    '''
+
+    results = {}
+    classes = np.asarray(classes)
+    X_first, y_first = [], []
+    seen = 0
+    train_time = 0.0
+
+    for features, income in census.read_parts(parts):
+        if sample_size is not None:
+            features, income = features[:sample_size - seen], income[:sample_size - seen]
+        X = features.to_numpy(dtype=np.float32)
+        y = income.to_numpy()
+        if seen < 300:
+            X_first.append(X[:300 - seen])
+            y_first.append(y[:300 - seen])
+
+        start = perf_counter()
+        _partial_fit(learner, X, y, classes, trees_per_chunk)
+        train_time += perf_counter() - start
+
+        seen += len(X)
+        if sample_size is not None and seen >= sample_size:
+            break
+
+    results['train_time'] = train_time
+
+    X_test = np.asarray(X_test, dtype=np.float32)
+    start = perf_counter()
+    predictions_test = learner.predict(X_test)
+    predictions_train = learner.predict(np.vstack(X_first))
+    results['pred_time'] = perf_counter() - start
+
+    scores_train = metrics.binary_scores(np.concatenate(y_first), predictions_train)
+    results['acc_train'] = scores_train['accuracy']
+    results['f_train'] = scores_train['f0.5']
+
+    scores_test = metrics.binary_scores(y_test, predictions_test)
+    results['acc_test'] = scores_test['accuracy']
+    results['f_test'] = scores_test['f0.5']
+
+    print("{} trained incrementally on {} samples.".format(learner.__class__.__name__, seen))
+    return results
+
+
+def incremental_sweep(learners, sample_sizes, parts, X_test, y_test, **kwargs):
+    '''
+    The learner x sample size comparison of the notebook, trained out of core with
+    train_predict_incremental. Returns results[clf_name][i] for vs.evaluate.
+    '''
+
+    results = {}
+    for learner in learners:
+        clf_name = learner.__class__.__name__
+        results[clf_name] = {}
+        for i, size in enumerate(sample_sizes):
+            results[clf_name][i] = train_predict_incremental(clone(learner), parts, X_test, y_test,
+                                                             sample_size=size, **kwargs)
+    return results